@@ -1,6 +1,7 @@
 import numpy as np
 import numpy.linalg
 import scipy.sparse
+import scipy.special
 import scipy.stats
 import sys
 from typing import Union
@@ -39,6 +40,10 @@ def likelihood_ratio_test(
     return pvals
 
 
+# Largest size of the smaller group for which scipy.stats.mannwhitneyu(method="auto") uses the exact test.
+_MWU_MAX_N_EXACT = 8
+
+
 def mann_whitney_u_test(
         x0: Union[np.ndarray, scipy.sparse.csr_matrix],
         x1: Union[np.ndarray, scipy.sparse.csr_matrix]
@@ -48,6 +53,11 @@ def mann_whitney_u_test(
 
     The Wilcoxon rank sum test is a non-parameteric test
     to compare two groups of observations.
+    P-values are computed with the same method choice as scipy.stats.mannwhitneyu() with
+    use_continuity=True and method="auto": genes without ties are tested with the exact
+    distribution of the U statistic if one of the groups has at most 8 observations, all other
+    genes are tested for all genes at once based on the normal approximation of the
+    U statistic with tie and continuity correction (method="asymptotic").
 
     :param x0: (observations x genes)
         Observations in first group by gene
@@ -64,17 +74,144 @@ def mann_whitney_u_test(
     if np.any(x0.shape[axis] != x1.shape[axis]):
         raise ValueError('the first axis (number of tests) is not allowed to differ between x0 and x1')
 
-    pvals = np.asarray([
-        scipy.stats.mannwhitneyu(
-            x=np.asarray(x0[:, i].todense()).flatten() if isinstance(x0, scipy.sparse.csr_matrix) else x0[:, i],
-            y=np.asarray(x1[:, i].todense()).flatten() if isinstance(x0, scipy.sparse.csr_matrix) else x1[:, i],
-            use_continuity=True,
-            alternative="two-sided"
-        ).pvalue for i in range(x0.shape[1])
-    ])
+    n0 = x0.shape[0]
+    n1 = x1.shape[0]
+    n = n0 + n1
+    n_genes = x0.shape[1]
+    if scipy.sparse.issparse(x0) and scipy.sparse.issparse(x1):
+        # Only the non-zero entries are ranked, all zeros of a gene form a single group of ties.
+        rank_sum0, tie_term = _rank_sum_sparse(x0=x0, x1=x1)
+    else:
+        rank_sum0 = np.zeros([n_genes])
+        tie_term = np.zeros([n_genes])
+        # Genes are processed in blocks so that only a block of the observations is densified at a time.
+        block_size = max(1, 10000000 // n)
+        for start in range(0, n_genes, block_size):
+            idx = np.arange(start, min(start + block_size, n_genes))
+            x = np.concatenate([
+                x0[:, idx].toarray() if scipy.sparse.issparse(x0) else np.asarray(x0[:, idx]),
+                x1[:, idx].toarray() if scipy.sparse.issparse(x1) else np.asarray(x1[:, idx])
+            ], axis=0)
+            rank_sum0[idx], tie_term[idx] = _rank_sum(x=x, n0=n0)
+
+    u0 = rank_sum0 - n0 * (n0 + 1) / 2
+    u = np.maximum(u0, n0 * n1 - u0)
+    sd = np.sqrt(n0 * n1 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z_statistic = (u - n0 * n1 / 2 - 0.5) / sd  # with continuity correction
+    pvals = 2 * scipy.special.ndtr(-z_statistic)  # two-tailed test
+    np.clip(pvals, 0, 1, out=pvals)
+
+    # Small samples without ties: exact distribution of U as selected by scipy's method="auto".
+    if min(n0, n1) <= _MWU_MAX_N_EXACT:
+        idx_exact = np.flatnonzero(tie_term == 0)
+        block_size = max(1, 10000000 // n)
+        for start in range(0, idx_exact.shape[0], block_size):
+            idx = idx_exact[start:(start + block_size)]
+            pvals[idx] = scipy.stats.mannwhitneyu(
+                x=x0[:, idx].toarray() if scipy.sparse.issparse(x0) else np.asarray(x0[:, idx]),
+                y=x1[:, idx].toarray() if scipy.sparse.issparse(x1) else np.asarray(x1[:, idx]),
+                use_continuity=True,
+                alternative="two-sided",
+                axis=0,
+                method="exact"
+            ).pvalue
     return pvals
 
 
+def _rank_sum(
+        x: np.ndarray,
+        n0: int
+):
+    """
+    Rank sum of the first group and tie correction term of all columns of a dense block of observations.
+
+    :param x: np.array (observations x genes)
+        Observations of first and second group by gene, the first n0 rows belong to the first group.
+    :param n0: Number of observations in first group.
+    :return: Tuple of rank sums of first group and sums of t^3-t over all groups of t tied observations by gene.
+    """
+    n = x.shape[0]
+    order = np.argsort(x, axis=0, kind="mergesort")
+    x_sorted = np.take_along_axis(x, order, axis=0)
+    # Mark the first and the last observation of each run of tied values.
+    is_new = np.ones(x_sorted.shape, dtype=bool)
+    np.not_equal(x_sorted[1:], x_sorted[:-1], out=is_new[1:])
+    is_end = np.ones(x_sorted.shape, dtype=bool)
+    is_end[:-1] = is_new[1:]
+    pos = np.arange(n)[:, np.newaxis]
+    first = np.maximum.accumulate(np.where(is_new, pos, 0), axis=0)
+    last = np.minimum.accumulate(np.where(is_end, pos, n - 1)[::-1], axis=0)[::-1]
+    # Tied observations share the average of their ranks, ranks start at 1.
+    ranks = (first + last) / 2 + 1
+    rank_sum0 = np.sum(ranks, axis=0, where=order < n0)
+    # Each of the t members of a group of ties contributes t^2-1 so that each group contributes t^3-t.
+    n_ties = last - first + 1
+    tie_term = np.sum(np.square(n_ties) - 1, axis=0)
+    return rank_sum0, tie_term
+
+
+def _rank_sum_sparse(
+        x0: scipy.sparse.spmatrix,
+        x1: scipy.sparse.spmatrix
+):
+    """
+    Rank sum of the first group and tie correction term of all columns of sparse observations.
+
+    Only the non-zero entries are sorted: the zeros of a gene form one group of ties whose
+    rank follows from the number of negative entries, and positive entries are shifted by the
+    number of zeros.
+
+    :param x0: scipy.sparse (observations x genes)
+        Observations in first group by gene.
+    :param x1: scipy.sparse (observations x genes)
+        Observations in second group by gene.
+    :return: Tuple of rank sums of first group and sums of t^3-t over all groups of t tied observations by gene.
+    """
+    n0 = x0.shape[0]
+    n = n0 + x1.shape[0]
+    n_genes = x0.shape[1]
+    # Column slices are passed as CSC by the rank test, tocsc() does not copy those.
+    x0 = x0.tocsc()
+    x1 = x1.tocsc()
+    genes0 = np.repeat(np.arange(n_genes), np.diff(x0.indptr))
+    genes1 = np.repeat(np.arange(n_genes), np.diff(x1.indptr))
+    # Explicitly stored zeros are counted with the zeros of their gene.
+    is_nonzero0 = x0.data != 0
+    is_nonzero1 = x1.data != 0
+    genes = np.concatenate([genes0[is_nonzero0], genes1[is_nonzero1]])
+    values = np.concatenate([x0.data[is_nonzero0], x1.data[is_nonzero1]])
+    is_x0 = np.arange(values.shape[0]) < np.count_nonzero(is_nonzero0)
+    nnz0 = np.bincount(genes0[is_nonzero0], minlength=n_genes)
+    nnz = np.bincount(genes, minlength=n_genes)
+    n_zeros = n - nnz
+    # Sort non-zero entries by gene and by value within each gene.
+    order = np.lexsort((values, genes))
+    values = values[order]
+    genes = genes[order]
+    is_x0 = is_x0[order]
+    # Mark the first and the last entry of each run of tied values within a gene.
+    is_new = np.ones(values.shape, dtype=bool)
+    is_new[1:] = (values[1:] != values[:-1]) | (genes[1:] != genes[:-1])
+    is_end = np.ones(values.shape, dtype=bool)
+    is_end[:-1] = is_new[1:]
+    pos = np.arange(values.shape[0])
+    first = np.maximum.accumulate(np.where(is_new, pos, 0))
+    last = np.minimum.accumulate(np.where(is_end, pos, values.shape[0] - 1)[::-1])[::-1]
+    gene_start = np.concatenate([[0], np.cumsum(nnz)[:-1]])
+    ranks = (first + last) / 2 + 1 - gene_start[genes]
+    is_pos = values > 0
+    ranks[is_pos] += n_zeros[genes[is_pos]]
+    n_neg = np.bincount(genes, weights=~is_pos, minlength=n_genes)
+    rank_zeros = n_neg + (n_zeros + 1) / 2
+    rank_sum0 = (n0 - nnz0) * rank_zeros
+    rank_sum0 += np.bincount(genes[is_x0], weights=ranks[is_x0], minlength=n_genes)
+    # Each of the t members of a group of ties contributes t^2-1 so that each group contributes t^3-t.
+    tie_term = n_zeros * (np.square(n_zeros) - 1.)
+    tie_term += np.bincount(genes, weights=np.square(last - first + 1) - 1, minlength=n_genes)
+    return rank_sum0, tie_term
+
+
 def t_test_raw(
         x0,
         x1,
@@ -145,7 +282,11 @@ def t_test_moments(
     if len(var0) != len(var1):
         raise ValueError('stats.t_test_moments(): mu and mu1 have to contain the same number of entries')
 
-    s_delta = np.sqrt((var0 / n0) + (var1 / n1))
+    # The scaled group variances are shared by the standard error and the degrees of freedom.
+    v0 = var0 / n0
+    v1 = var1 / n1
+    s2_delta = v0 + v1
+    s_delta = np.sqrt(s2_delta)
     np.clip(
         s_delta,
         a_min=np.nextafter(0, np.inf, dtype=s_delta.dtype),
@@ -155,10 +296,11 @@ def t_test_moments(
 
     t_statistic = np.abs(mu0 - mu1) / s_delta
 
-    divisor = (
-            (np.square(var0 / n0) / (n0 - 1)) +
-            (np.square(var1 / n1) / (n1 - 1))
-    )
+    np.square(v0, out=v0)
+    v0 /= n0 - 1
+    np.square(v1, out=v1)
+    v1 /= n1 - 1
+    divisor = np.add(v0, v1, out=v0)
     np.clip(
         divisor,
         a_min=np.nextafter(0, np.inf, dtype=divisor.dtype),
@@ -166,7 +308,8 @@ def t_test_moments(
         out=divisor
     )
 
-    df = np.square((var0 / n0) + (var1 / n1)) / divisor
+    df = np.square(s2_delta, out=s2_delta)
+    df /= divisor
     np.clip(
         df,
         a_min=np.nextafter(0, np.inf, dtype=df.dtype),
@@ -174,7 +317,9 @@ def t_test_moments(
         out=df
     )
 
-    pval = 2 * scipy.stats.t.sf(t_statistic, df)
+    # Student t cdf ufunc, equivalent to scipy.stats.t.sf(t_statistic, df) without the distribution overhead.
+    pval = scipy.special.stdtr(df, -t_statistic)
+    pval *= 2
     return pval
 
 
@@ -265,7 +410,7 @@ def wald_test_chisq(
 
     theta_diff = theta_mle - theta0
     invertible = np.where(np.linalg.cond(theta_covar, p=None) < 1 / sys.float_info.epsilon)[0]
-    wald_statistic = np.zeros([theta_covar.shape[0]]) + np.nan
+    wald_statistic = np.full([theta_covar.shape[0]], np.nan)
     wald_statistic[invertible] = np.array([
         np.matmul(
             np.matmul(
@@ -322,7 +467,9 @@ def two_coef_z_test(
     divisor = np.nextafter(0, np.inf, out=divisor, where=divisor < np.nextafter(0, np.inf))
     divisor = np.sqrt(divisor)
     z_statistic = np.abs((theta_mle0 - theta_mle1)) / divisor
-    pvals = 2 * (1 - scipy.stats.norm(loc=0, scale=1).cdf(z_statistic))  # two-tailed test
+    # Standard normal cdf ufunc, equivalent to scipy.stats.norm.sf(z_statistic) without the distribution overhead.
+    pvals = scipy.special.ndtr(np.negative(z_statistic, out=z_statistic))
+    pvals *= 2  # two-tailed test
     return pvals
 
 
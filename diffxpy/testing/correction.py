@@ -11,14 +11,48 @@ def correct(pvals, method="fdr_bh", alpha=0.05):
             Browse available methods in the annotation of statsmodels.stats.multitest.multipletests().
     :param alpha: FWER, family-wise error rate, e.g. 0.1
     """
-    # Only correct non-nan p-values.
-    qval = np.zeros([pvals.shape[0]]) + np.nan
-    qval[np.isnan(pvals) == False] = statsmodels.stats.multitest.multipletests(
-        pvals=pvals[np.isnan(pvals) == False],
-        alpha=alpha,
-        method=method,
-        is_sorted=False,
-        returnsorted=False
-    )[1]
+    # Only correct non-nan p-values, the mask is computed once and also covers the all-nan case.
+    is_tested = np.logical_not(np.isnan(pvals))
+    qval = np.full([pvals.shape[0]], np.nan)
+    if np.any(is_tested):
+        qval[is_tested] = statsmodels.stats.multitest.multipletests(
+            pvals=pvals[is_tested],
+            alpha=alpha,
+            method=method,
+            is_sorted=False,
+            returnsorted=False
+        )[1]
 
     return qval
+
+
+def correct_by_test(pvals, method="fdr_bh", alpha=0.05):
+    """
+    Performs multiple testing corrections separately for each test, ie. along the last axis.
+
+    Benjamini-Hochberg correction is computed for all tests at once, all other methods
+    are delegated to correct() test by test.
+
+    :param pvals: uncorrected p-values, the last axis contains the p-values of one test.
+    :param method: Multiple testing correction method.
+            Browse available methods in the annotation of statsmodels.stats.multitest.multipletests().
+    :param alpha: FWER, family-wise error rate, e.g. 0.1
+    """
+    pvals = np.asarray(pvals, dtype=np.float64)
+    pvals_2d = pvals.reshape(-1, pvals.shape[-1])
+    if method.lower() != "fdr_bh":
+        qval = np.stack([correct(pvals=pv, method=method, alpha=alpha) for pv in pvals_2d], axis=0)
+        return qval.reshape(pvals.shape)
+
+    # Untested (nan) p-values are sorted to the end of each test and do not count towards the number of tests.
+    n_tested = np.sum(np.logical_not(np.isnan(pvals_2d)), axis=1, keepdims=True)
+    order = np.argsort(pvals_2d, axis=1)
+    qval_sorted = np.take_along_axis(pvals_2d, order, axis=1)
+    qval_sorted *= n_tested
+    qval_sorted /= np.arange(1, pvals_2d.shape[1] + 1)
+    # Enforce monotonicity from the largest p-value downwards, fmin skips the trailing nans.
+    qval_sorted = np.fmin.accumulate(qval_sorted[:, ::-1], axis=1)[:, ::-1]
+    np.minimum(qval_sorted, 1., out=qval_sorted)
+    qval = np.empty_like(qval_sorted)
+    np.put_along_axis(qval, order, qval_sorted, axis=1)
+    return qval.reshape(pvals.shape)
@@ -1,4 +1,5 @@
 import abc
+import functools
 try:
     import anndata
 except ImportError:
@@ -14,13 +15,39 @@ import scipy.sparse
 import sparse
 from typing import Union, Dict, Tuple, List, Set
 
-from .utils import split_x, dmat_unique
+from .utils import split_x, dmat_unique, mean_var
 from ..stats import stats
 from . import correction
 
 logger = logging.getLogger("diffxpy")
 
 
+@functools.lru_cache(maxsize=8)
+def _inv_log(base: float) -> float:
+    """
+    Reciprocal of the natural logarithm of a logarithm base.
+
+    Fold changes are converted from natural logarithms to another base by multiplication with this factor.
+
+    :param base: Base of logarithm.
+    :return: 1 / log(base)
+    """
+    return 1. / np.log(base)
+
+
+def _pearson(x: np.ndarray, y: np.ndarray) -> float:
+    """
+    Pearson correlation coefficient of two vectors.
+
+    :param x: First vector.
+    :param y: Second vector.
+    :return: Correlation coefficient.
+    """
+    xm = x - x.mean()
+    ym = y - y.mean()
+    return (xm @ ym) / np.sqrt((xm @ xm) * (ym @ ym))
+
+
 class _DifferentialExpressionTest(metaclass=abc.ABCMeta):
     """
     Dummy class specifying all needed methods / parameters necessary for DifferentialExpressionTest.
@@ -42,6 +69,7 @@ class _DifferentialExpressionTest(metaclass=abc.ABCMeta):
         self._qval = None
         self._mean = None
         self._log_likelihood = None
+        self._cache = {}
 
     @property
     @abc.abstractmethod
@@ -60,8 +88,14 @@ class _DifferentialExpressionTest(metaclass=abc.ABCMeta):
     def log2_fold_change(self, **kwargs):
         """
         Calculates the pairwise log_2 fold change(s) for this DifferentialExpressionTest.
+
+        The default output (no keyword arguments) is memoized as it is shared by summaries and plots.
         """
-        return self.log_fold_change(base=2, **kwargs)
+        if len(kwargs) > 0:
+            return self.log_fold_change(base=2, **kwargs)
+        if "log2fc" not in self._cache:
+            self._cache["log2fc"] = self.log_fold_change(base=2)
+        return self._cache["log2fc"]
 
     def log10_fold_change(self, **kwargs):
         """
@@ -80,10 +114,8 @@ class _DifferentialExpressionTest(metaclass=abc.ABCMeta):
         :param method: Multiple testing correction method.
             Browse available methods in the annotation of statsmodels.stats.multitest.multipletests().
         """
-        if np.all(np.isnan(self.pval)):
-            return self.pval
-        else:
-            return correction.correct(pvals=self.pval, method=method)
+        # All-NaN p-values are handled by correction.correct() without a separate pass over the p-values.
+        return correction.correct(pvals=self.pval, method=method)
 
     def _ave(self):
         """
@@ -102,19 +134,28 @@ class _DifferentialExpressionTest(metaclass=abc.ABCMeta):
     @property
     def mean(self):
         if self._mean is None:
-            self._mean = self._ave()
+            # Store a flat array once so that consumers do not need to convert the mean again.
+            self._mean = np.asarray(self._ave()).ravel()
         return self._mean
 
     @property
     def pval(self):
+        """
+        Read-only p-values, copy before modifying.
+        """
         if self._pval is None:
-            self._pval = self._test().copy()
+            self._pval = np.asarray(self._test())
+            self._pval.setflags(write=False)
         return self._pval
 
     @property
     def qval(self, method="fdr_bh"):
+        """
+        Read-only q-values, copy before modifying.
+        """
         if self._qval is None:
-            self._qval = self._correction(method=method).copy()
+            self._qval = np.asarray(self._correction(method=method))
+            self._qval.setflags(write=False)
         return self._qval
 
     def log10_pval_clean(self, log10_threshold=-30):
@@ -127,15 +168,12 @@ class _DifferentialExpressionTest(metaclass=abc.ABCMeta):
         :param log10_threshold: minimal log10 p-value to return.
         :return: Cleaned log10 transformed p-values.
         """
-        pvals = np.reshape(self.pval, -1).astype(dtype=np.float)
-        pvals = np.clip(
-            pvals,
-            np.nextafter(0, 1),
-            np.inf
-        )
-        log10_pval_clean = np.log(pvals) / np.log(10)
-        log10_pval_clean[np.isnan(log10_pval_clean)] = 1
-        log10_pval_clean = np.clip(log10_pval_clean, log10_threshold, 0, log10_pval_clean)
+        pvals = np.asarray(self.pval, dtype=np.float64).ravel()
+        log10_pval_clean = np.empty_like(pvals)
+        np.clip(pvals, np.nextafter(0, 1), None, out=log10_pval_clean)
+        np.log10(log10_pval_clean, out=log10_pval_clean)
+        np.nan_to_num(log10_pval_clean, copy=False, nan=1.)
+        np.clip(log10_pval_clean, log10_threshold, 0, out=log10_pval_clean)
         return log10_pval_clean
 
     def log10_qval_clean(self, log10_threshold=-30):
@@ -148,15 +186,12 @@ class _DifferentialExpressionTest(metaclass=abc.ABCMeta):
         :param log10_threshold: minimal log10 q-value to return.
         :return: Cleaned log10 transformed q-values.
         """
-        qvals = np.reshape(self.qval, -1).astype(dtype=np.float)
-        qvals = np.clip(
-            qvals,
-            np.nextafter(0, 1),
-            np.inf
-        )
-        log10_qval_clean = np.log(qvals) / np.log(10)
-        log10_qval_clean[np.isnan(log10_qval_clean)] = 1
-        log10_qval_clean = np.clip(log10_qval_clean, log10_threshold, 0, log10_qval_clean)
+        qvals = np.asarray(self.qval, dtype=np.float64).ravel()
+        log10_qval_clean = np.empty_like(qvals)
+        np.clip(qvals, np.nextafter(0, 1), None, out=log10_qval_clean)
+        np.log10(log10_qval_clean, out=log10_qval_clean)
+        np.nan_to_num(log10_qval_clean, copy=False, nan=1.)
+        np.clip(log10_qval_clean, log10_threshold, 0, out=log10_qval_clean)
         return log10_qval_clean
 
     @abc.abstractmethod
@@ -181,28 +216,95 @@ class _DifferentialExpressionTest(metaclass=abc.ABCMeta):
         :param mean_thres: Lower bound of average expression for gene to be included.
         :return: Filtered summary table.
         """
+        keep = self._threshold_mask(
+            qval=res['qval'].values if qval_thres is not None else None,
+            log2fc=res['log2fc'].values if fc_upper_thres is not None or fc_lower_thres is not None else None,
+            mean=res['mean'].values if mean_thres is not None else None,
+            qval_thres=qval_thres,
+            fc_upper_thres=fc_upper_thres,
+            fc_lower_thres=fc_lower_thres,
+            mean_thres=mean_thres
+        )
+        if keep is None:
+            return res
+        return res.iloc[keep, :]
+
+    @staticmethod
+    def _threshold_mask(
+            qval: Union[np.ndarray, None],
+            log2fc: Union[np.ndarray, None],
+            mean: Union[np.ndarray, None],
+            qval_thres=None,
+            fc_upper_thres=None,
+            fc_lower_thres=None,
+            mean_thres=None
+    ) -> Union[np.ndarray, None]:
+        """
+        Select genes which pass the desired thresholds.
+
+        Only the values that are thresholded need to be supplied.
+
+        :param qval: Corrected p-values by gene.
+        :param log2fc: log2 fold changes by gene.
+        :param mean: Average expression by gene.
+        :param qval_thres: Upper bound of corrected p-values for gene to be included.
+        :param fc_upper_thres: Upper bound of fold-change for gene to be included.
+        :param fc_lower_thres: Lower bound of fold-change p-values for gene to be included.
+        :param mean_thres: Lower bound of average expression for gene to be included.
+        :return: Boolean mask of genes to include, None if no threshold was supplied.
+        """
         assert fc_lower_thres > 0 if fc_lower_thres is not None else True, "supply positive fc_lower_thres"
         assert fc_upper_thres > 0 if fc_upper_thres is not None else True, "supply positive fc_upper_thres"
 
+        if qval_thres is None and fc_upper_thres is None and fc_lower_thres is None and mean_thres is None:
+            return None
+
+        # Collect all criteria in one mask so that the table is only subset once.
+        keep = None
         if qval_thres is not None:
-            qvals = res['qval'].values
-            qval_include = np.logical_not(np.isnan(qvals))
-            qval_include[qval_include] = qvals[qval_include] <= qval_thres
-            res = res.iloc[qval_include, :]
-
-        if fc_upper_thres is not None and fc_lower_thres is None:
-            res = res.iloc[res['log2fc'].values >= np.log(fc_upper_thres) / np.log(2), :]
-        elif fc_upper_thres is None and fc_lower_thres is not None:
-            res = res.iloc[res['log2fc'].values <= np.log(fc_lower_thres) / np.log(2), :]
-        elif fc_upper_thres is not None and fc_lower_thres is not None:
-            res = res.iloc[np.logical_or(
-                res['log2fc'].values <= np.log(fc_lower_thres) / np.log(2),
-                res['log2fc'].values >= np.log(fc_upper_thres) / np.log(2)), :]
+            # NaN q-values compare as False and are therefore excluded.
+            keep = np.asarray(qval) <= qval_thres
+
+        if fc_upper_thres is not None or fc_lower_thres is not None:
+            log2fc = np.asarray(log2fc)
+            if fc_upper_thres is not None and fc_lower_thres is None:
+                keep_fc = log2fc >= np.log2(fc_upper_thres)
+            elif fc_upper_thres is None and fc_lower_thres is not None:
+                keep_fc = log2fc <= np.log2(fc_lower_thres)
+            else:
+                keep_fc = np.logical_or(
+                    log2fc <= np.log2(fc_lower_thres),
+                    log2fc >= np.log2(fc_upper_thres)
+                )
+            keep = keep_fc if keep is None else np.logical_and(keep, keep_fc, out=keep)
 
         if mean_thres is not None:
-            res = res.iloc[res['mean'].values >= mean_thres, :]
+            keep_mean = np.asarray(mean) >= mean_thres
+            keep = keep_mean if keep is None else np.logical_and(keep, keep_mean, out=keep)
 
-        return res
+        return keep
+
+    def _idx_highlights(self, highlight_ids: Union[List, Tuple]) -> np.ndarray:
+        """
+        Find the positions of genes to highlight in plots in gene_ids.
+
+        Genes that are not found in the data set are dropped with a warning.
+
+        :param highlight_ids: Genes to highlight.
+        :return: Indices of found genes in gene_ids.
+        """
+        if len(highlight_ids) == 0:
+            return np.array([], dtype=int)
+        if "gene_index" not in self._cache:
+            self._cache["gene_index"] = {g: i for i, g in enumerate(self.gene_ids.tolist())}
+        gene_index = self._cache["gene_index"]
+        idx = [gene_index.get(x, -1) for x in highlight_ids]
+        if -1 in idx:
+            logger.warning(
+                "not all highlight_ids were found in data set: %s",
+                ", ".join([str(x) for x, i in zip(highlight_ids, idx) if i == -1])
+            )
+        return np.array([i for i in idx if i != -1], dtype=int)
 
     def plot_volcano(
             self,
@@ -255,34 +357,26 @@ class _DifferentialExpressionTest(metaclass=abc.ABCMeta):
             neg_log_pvals = - self.log10_pval_clean(log10_threshold=log10_p_threshold)
 
         logfc = np.reshape(self.log2_fold_change(), -1)
-        # Clipping throws errors if not performed in actual data format (ndarray or DataArray):
-        logfc = np.clip(logfc, -log2_fc_threshold, log2_fc_threshold, logfc)
+        # Clip into a new array so that the memoized fold changes are not modified:
+        logfc = np.clip(logfc, -log2_fc_threshold, log2_fc_threshold)
 
         fig, ax = plt.subplots()
 
-        is_significant = np.logical_and(
-            neg_log_pvals >= - np.log(alpha) / np.log(10),
-            np.abs(logfc) >= np.log(min_fc) / np.log(2)
-        )
+        # Combine both significance criteria in place in a single mask.
+        p_thresh = - np.log10(alpha)
+        fc_thresh = np.log2(min_fc)
+        is_significant = neg_log_pvals >= p_thresh
+        is_significant &= np.abs(logfc) >= fc_thresh
 
         sns.scatterplot(y=neg_log_pvals, x=logfc, hue=is_significant, ax=ax,
                         legend=False, s=size,
                         palette={True: "orange", False: "black"})
 
-        highlight_ids_found = np.array([x in self.gene_ids for x in highlight_ids])
-        highlight_ids_clean = [highlight_ids[i] for i in np.where(highlight_ids_found)[0]]
-        highlight_ids_not_found = [highlight_ids[i] for i in np.where(np.logical_not(highlight_ids_found))[0]]
-        if len(highlight_ids_not_found) > 0:
-            logger.warning("not all highlight_ids were found in data set: ", ", ".join(highlight_ids_not_found))
-
-        if len(highlight_ids_clean) > 0:
-            neg_log_pvals_highlights = np.zeros([len(highlight_ids_clean)])
-            logfc_highlights = np.zeros([len(highlight_ids_clean)])
-            is_highlight = np.zeros([len(highlight_ids_clean)])
-            for i, id_i in enumerate(highlight_ids_clean):
-                idx = np.where(self.gene_ids == id_i)[0]
-                neg_log_pvals_highlights[i] = neg_log_pvals[idx]
-                logfc_highlights[i] = logfc[idx]
+        idx_highlights = self._idx_highlights(highlight_ids=highlight_ids)
+        if len(idx_highlights) > 0:
+            neg_log_pvals_highlights = neg_log_pvals.take(idx_highlights)
+            logfc_highlights = logfc.take(idx_highlights)
+            is_highlight = np.zeros([len(idx_highlights)])
 
             sns.scatterplot(y=neg_log_pvals_highlights, x=logfc_highlights,
                             hue=is_highlight, ax=ax,
@@ -356,45 +450,35 @@ class _DifferentialExpressionTest(metaclass=abc.ABCMeta):
 
         plt.ioff()
 
-        ave = np.log(np.clip(
-            self.mean.astype(dtype=np.float),
-            np.max(np.array([np.nextafter(0, 1), min_mean])),
-            np.inf
-        ))
+        # Floor and log-transform the mean expression within one buffer.
+        ave = np.array(self.mean, dtype=np.float64)
+        np.clip(ave, max(np.nextafter(0, 1), min_mean), None, out=ave)
+        np.log(ave, out=ave)
 
         logfc = np.reshape(self.log2_fold_change(), -1)
-        # Clipping throws errors if not performed in actual data format (ndarray or DataArray):
-        logfc = np.clip(logfc, -log2_fc_threshold, log2_fc_threshold, logfc)
+        # Clip into a new array so that the memoized fold changes are not modified:
+        logfc = np.clip(logfc, -log2_fc_threshold, log2_fc_threshold)
 
         fig, ax = plt.subplots()
 
+        # Untested genes (NaN p-values) compare as non-significant, the stored p-values are not modified.
         if corrected_pval:
-            pvals = self.pval
-            pvals[np.isnan(pvals)] = 1
-            is_significant = pvals < alpha
+            pvals = self.qval
         else:
-            qvals = self.qval
-            qvals[np.isnan(qvals)] = 1
-            is_significant = qvals < alpha
+            pvals = self.pval
+        is_significant = np.empty(pvals.shape, dtype=bool)
+        np.less(pvals, alpha, out=is_significant)
+        is_significant &= np.logical_not(np.isnan(pvals))
 
         sns.scatterplot(y=logfc, x=ave, hue=is_significant, ax=ax,
                         legend=False, s=size,
                         palette={True: "orange", False: "black"})
 
-        highlight_ids_found = np.array([x in self.gene_ids for x in highlight_ids])
-        highlight_ids_clean = [highlight_ids[i] for i in np.where(highlight_ids_found)[0]]
-        highlight_ids_not_found = [highlight_ids[i] for i in np.where(np.logical_not(highlight_ids_found))[0]]
-        if len(highlight_ids_not_found) > 0:
-            logger.warning("not all highlight_ids were found in data set: ", ", ".join(highlight_ids_not_found))
-
-        if len(highlight_ids_clean) > 0:
-            ave_highlights = np.zeros([len(highlight_ids_clean)])
-            logfc_highlights = np.zeros([len(highlight_ids_clean)])
-            is_highlight = np.zeros([len(highlight_ids_clean)])
-            for i, id_i in enumerate(highlight_ids_clean):
-                idx = np.where(self.gene_ids == id_i)[0]
-                ave_highlights[i] = ave[idx]
-                logfc_highlights[i] = logfc[idx]
+        idx_highlights = self._idx_highlights(highlight_ids=highlight_ids)
+        if len(idx_highlights) > 0:
+            ave_highlights = ave.take(idx_highlights)
+            logfc_highlights = logfc.take(idx_highlights)
+            is_highlight = np.zeros([len(idx_highlights)])
 
             sns.scatterplot(x=ave_highlights, y=logfc_highlights,
                             hue=is_highlight, ax=ax,
@@ -446,14 +530,70 @@ class _DifferentialExpressionTestSingle(_DifferentialExpressionTest, metaclass=a
         """
         assert self.gene_ids is not None
 
+        return self._summary_table(keep=self._summary_keep(
+            qval_thres=qval_thres,
+            fc_upper_thres=fc_upper_thres,
+            fc_lower_thres=fc_lower_thres,
+            mean_thres=mean_thres
+        ))
+
+    def _summary_keep(
+            self,
+            qval_thres=None,
+            fc_upper_thres=None,
+            fc_lower_thres=None,
+            mean_thres=None
+    ) -> Union[np.ndarray, None]:
+        """
+        Select genes for the summary table before it is assembled, so that only passing genes are copied.
+
+        :param qval_thres: Upper bound of corrected p-values for gene to be included.
+        :param fc_upper_thres: Upper bound of fold-change for gene to be included.
+        :param fc_lower_thres: Lower bound of fold-change p-values for gene to be included.
+        :param mean_thres: Lower bound of average expression for gene to be included.
+        :return: Boolean mask of genes to include, None if no threshold was supplied.
+        """
+        return self._threshold_mask(
+            qval=self.qval if qval_thres is not None else None,
+            log2fc=self.log2_fold_change() if fc_upper_thres is not None or fc_lower_thres is not None else None,
+            mean=self.mean if mean_thres is not None else None,
+            qval_thres=qval_thres,
+            fc_upper_thres=fc_upper_thres,
+            fc_lower_thres=fc_lower_thres,
+            mean_thres=mean_thres
+        )
+
+    @staticmethod
+    def _subset_genes(x, keep: Union[np.ndarray, None]):
+        """
+        Subset gene-wise values to the genes selected for the summary table.
+
+        :param x: Values by gene.
+        :param keep: Boolean mask of genes to include, all genes are included if None.
+        :return: Selected values.
+        """
+        if keep is None:
+            return x
+        return np.asarray(x)[keep]
+
+    def _summary_table(self, keep: Union[np.ndarray, None] = None) -> pd.DataFrame:
+        """
+        Assemble the summary table columns shared by all single tests.
+
+        :param keep: Boolean mask of genes to include, all genes are included if None.
+        :return: Summary table, indexed by gene position in the full results.
+        """
+        # Resolve each property once before assembling the table.
+        # Subsets are fresh arrays that the table can take over, full result arrays are copied.
+        mean = self._subset_genes(self.mean, keep)
         res = pd.DataFrame({
-            "gene": self.gene_ids,
-            "pval": self.pval,
-            "qval": self.qval,
-            "log2fc": self.log2_fold_change(),
-            "mean": self.mean,
-            "zero_mean": self.mean == 0
-        })
+            "gene": self._subset_genes(self.gene_ids, keep),
+            "pval": self._subset_genes(self.pval, keep),
+            "qval": self._subset_genes(self.qval, keep),
+            "log2fc": self._subset_genes(self.log2_fold_change(), keep),
+            "mean": mean,
+            "zero_mean": mean == 0
+        }, index=np.flatnonzero(keep) if keep is not None else None, copy=keep is None)
 
         return res
 
@@ -546,11 +686,13 @@ class DifferentialExpressionTestLRT(_DifferentialExpressionTestSingle):
 
         # factors = factors.intersection(di.term_names)
 
-        # select the columns of the factors
-        cols = np.arange(len(di.column_names))
-        sel = np.concatenate([cols[di.slice(f)] for f in factors], axis=0)
-        neg_sel = np.ones_like(cols).astype(bool)
-        neg_sel[sel] = False
+        # select the columns of the factors, the column slices of all terms are looked up once per test
+        if "factor_cols" not in self._cache:
+            self._cache["factor_cols"] = {f: di.slice(f) for f in di.term_names}
+        factor_cols = self._cache["factor_cols"]
+        neg_sel = np.ones([len(di.column_names)], dtype=bool)
+        for f in factors:
+            neg_sel[factor_cols[f]] = False
 
         # overwrite all columns which are not specified by the factors with 0
         dmat[:, neg_sel] = 0
@@ -558,11 +700,15 @@ class DifferentialExpressionTestLRT(_DifferentialExpressionTestSingle):
         # make the design matrix + sample description unique again
         dmat, sample_description = dmat_unique(dmat, sample_description)
 
-        locations = self.full_estim.model.inverse_link_loc(np.matmul(dmat, self.full_estim.model.a))
-        locations = np.log(locations) / np.log(base)
+        # Contiguous operands of matching type allow the product to be dispatched to BLAS.
+        a = np.ascontiguousarray(self.full_estim.model.a)
+        dmat = np.ascontiguousarray(dmat, dtype=a.dtype)
+        locations = np.asarray(self.full_estim.model.inverse_link_loc(dmat @ a))
+        # Transform in place and build all pairwise differences (groups x groups x genes) in one broadcast:
+        np.log(locations, out=locations)
+        locations *= _inv_log(base)
 
-        dist = np.expand_dims(locations, axis=0)
-        dist = np.transpose(dist, [1, 0, 2]) - dist
+        dist = locations[:, np.newaxis, :] - locations[np.newaxis, :, :]
 
         # # If this is a pairwise comparison, return only one fold change per gene
         # if dist.shape[:2] == (2, 2):
@@ -615,8 +761,10 @@ class DifferentialExpressionTestLRT(_DifferentialExpressionTestSingle):
         dmat = self.full_estim.input_data.design_loc
 
         dmat, sample_description = dmat_unique(dmat, sample_description)
+        a = np.ascontiguousarray(self.full_estim.model.a)
+        dmat = np.ascontiguousarray(dmat, dtype=a.dtype)
 
-        retval = self.full_estim.model.inverse_link_loc(np.matmul(dmat, self.full_estim.model.a))
+        retval = self.full_estim.model.inverse_link_loc(dmat @ a)
         retval = pd.DataFrame(retval, columns=self.full_estim.input_data.features)
         for col in sample_description:
             retval[col] = sample_description[col]
@@ -637,8 +785,10 @@ class DifferentialExpressionTestLRT(_DifferentialExpressionTestSingle):
         dmat = self.full_estim.input_data.design_scale
 
         dmat, sample_description = dmat_unique(dmat, sample_description)
+        b = np.ascontiguousarray(self.full_estim.model.b)
+        dmat = np.ascontiguousarray(dmat, dtype=b.dtype)
 
-        retval = self.full_estim.inverse_link_scale(dmat.doc(self.full_estim.par_link_scale))
+        retval = self.full_estim.model.inverse_link_scale(dmat @ b)
         retval = pd.DataFrame(retval, columns=self.full_estim.input_data.features)
         for col in sample_description:
             retval[col] = sample_description[col]
@@ -664,17 +814,15 @@ class DifferentialExpressionTestLRT(_DifferentialExpressionTestSingle):
         :param mean_thres: Lower bound of average expression for gene to be included.
         :return: Summary table of differential expression test.
         """
-        res = super().summary(**kwargs)
-        res["grad"] = self.full_model_gradient.data
-        res["grad_red"] = self.reduced_model_gradient.data
-
-        res = self._threshold_summary(
-            res=res,
+        keep = self._summary_keep(
             qval_thres=qval_thres,
             fc_upper_thres=fc_upper_thres,
             fc_lower_thres=fc_lower_thres,
             mean_thres=mean_thres
         )
+        res = self._summary_table(keep=keep)
+        res["grad"] = self._subset_genes(self.full_model_gradient.data, keep)
+        res["grad_red"] = self._subset_genes(self.reduced_model_gradient.data, keep)
 
         return res
 
@@ -755,14 +903,13 @@ class DifferentialExpressionTestWald(_DifferentialExpressionTestSingle):
         if len(self.coef_loc_totest) == 1:
             return self.model_estim.a_var[self.coef_loc_totest][0]
         else:
-            idx0 = np.argmax(np.abs(self.model_estim.a_var[self.coef_loc_totest]), axis=0)
-            idx1 = np.arange(len(idx0))
             # Leave the below for debugging right now, dask has different indexing than numpy does here:
             assert not isinstance(self.model_estim.a_var, dask.array.core.Array), \
                 "self.model_estim.a_var was dask array, aborting. Please file issue on github."
-            # Use advanced numpy indexing here:
-            # https://docs.scipy.org/doc/numpy/reference/arrays.indexing.html#advanced-indexing
-            return self.model_estim.a_var[self.coef_loc_totest, :][tuple(idx0), tuple(idx1)]
+            a_var_totest = self.model_estim.a_var[self.coef_loc_totest, :]
+            idx_max = np.argmax(np.abs(a_var_totest), axis=0)
+            # Gather the coefficient with the largest absolute value of each gene:
+            return np.take_along_axis(a_var_totest, idx_max[np.newaxis, :], axis=0)[0]
 
     def _ll(self):
         """
@@ -792,21 +939,26 @@ class DifferentialExpressionTestWald(_DifferentialExpressionTestSingle):
         self.theta_mle = self.model_estim.a_var[self.coef_loc_totest]
         if len(self.coef_loc_totest) == 1:
             self.theta_mle = self.theta_mle[0]
-            self.theta_sd = self.model_estim.fisher_inv[:, self.coef_loc_totest[0], self.coef_loc_totest[0]]
-            self.theta_sd = np.nextafter(0, np.inf, out=self.theta_sd, where=self.theta_sd < np.nextafter(0, np.inf))
-            self.theta_sd = np.sqrt(self.theta_sd)
+            # Copy as the variances are clipped and transformed to standard deviations in place below.
+            self.theta_sd = np.array(self.model_estim.fisher_inv[:, self.coef_loc_totest[0], self.coef_loc_totest[0]])
+            np.maximum(self.theta_sd, np.finfo(self.theta_sd.dtype).tiny, out=self.theta_sd)
+            np.sqrt(self.theta_sd, out=self.theta_sd)
             return stats.wald_test(
                 theta_mle=self.theta_mle,
                 theta_sd=self.theta_sd,
                 theta0=0
             )
         else:
-            self.theta_sd = np.diagonal(self.model_estim.fisher_inv, axis1=-2, axis2=-1).copy()
-            self.theta_sd = np.nextafter(0, np.inf, out=self.theta_sd, where=self.theta_sd < np.nextafter(0, np.inf))
-            self.theta_sd = np.sqrt(self.theta_sd)
+            # Gather the covariance block of the tested coefficients once and reuse it for the standard deviations.
+            theta_covar = np.ascontiguousarray(
+                self.model_estim.fisher_inv[:, self.coef_loc_totest, :][:, :, self.coef_loc_totest]
+            )
+            self.theta_sd = np.diagonal(theta_covar, axis1=-2, axis2=-1).copy()
+            np.maximum(self.theta_sd, np.finfo(self.theta_sd.dtype).tiny, out=self.theta_sd)
+            np.sqrt(self.theta_sd, out=self.theta_sd)
             return stats.wald_test_chisq(
                 theta_mle=self.theta_mle,
-                theta_covar=self.model_estim.fisher_inv[:, self.coef_loc_totest, :][:, :, self.coef_loc_totest],
+                theta_covar=theta_covar,
                 theta0=0
             )
 
@@ -827,27 +979,25 @@ class DifferentialExpressionTestWald(_DifferentialExpressionTestSingle):
         :param mean_thres: Lower bound of average expression for gene to be included.
         :return: Summary table of differential expression test.
         """
-        res = super().summary(**kwargs)
-        res["grad"] = self.model_gradient
+        keep = self._summary_keep(
+            qval_thres=qval_thres,
+            fc_upper_thres=fc_upper_thres,
+            fc_lower_thres=fc_lower_thres,
+            mean_thres=mean_thres
+        )
+        res = self._summary_table(keep=keep)
+        res["grad"] = self._subset_genes(self.model_gradient, keep)
         if len(self.theta_mle.shape) == 1:
-            res["coef_mle"] = self.theta_mle
+            res["coef_mle"] = self._subset_genes(self.theta_mle, keep)
         if len(self.theta_sd.shape) == 1:
-            res["coef_sd"] = self.theta_sd
+            res["coef_sd"] = self._subset_genes(self.theta_sd, keep)
         # add in info from bfgs
         if self.log_likelihood is not None:
-            res["ll"] = self.log_likelihood
+            res["ll"] = self._subset_genes(self.log_likelihood, keep)
         if self._error_codes is not None:
-            res["err"] = self._error_codes
+            res["err"] = self._subset_genes(self._error_codes, keep)
         if self._niter is not None:
-            res["niter"] = self._niter
-
-        res = self._threshold_summary(
-            res=res,
-            qval_thres=qval_thres,
-            fc_upper_thres=fc_upper_thres,
-            fc_lower_thres=fc_lower_thres,
-            mean_thres=mean_thres
-        )
+            res["niter"] = self._subset_genes(self._niter, keep)
 
         return res
 
@@ -879,13 +1029,17 @@ class DifferentialExpressionTestWald(_DifferentialExpressionTestSingle):
 
         grouping = np.asarray(self.model_estim.input_data.design_loc[:, self.coef_loc_totest])
         # Normalize by size factors that were used in regression.
+        x = self.model_estim.x
         if self.model_estim.input_data.size_factors is not None:
-            sf = np.broadcast_to(np.expand_dims(self.model_estim.input_data.size_factors, axis=1),
-                                 shape=self.model_estim.x.shape)
-        else:
-            sf = np.ones(shape=(self.model_estim.x.shape[0], 1))
+            sf = np.asarray(self.model_estim.input_data.size_factors).ravel()
+            if scipy.sparse.issparse(x):
+                # Scale the stored entries of each row instead of broadcasting a dense size factor matrix.
+                x = scipy.sparse.csr_matrix(x, dtype=np.float64, copy=True)
+                x.data /= np.repeat(sf, np.diff(x.indptr))
+            else:
+                x = x / np.expand_dims(sf, axis=1)
         ttest = t_test(
-            data=self.model_estim.x / sf,
+            data=x,
             grouping=grouping,
             gene_names=self.gene_ids,
         )
@@ -917,6 +1071,71 @@ class DifferentialExpressionTestWald(_DifferentialExpressionTestSingle):
         else:
             return
 
+    def _init_ols(self):
+        """
+        Set up and initialize an OLS model of the data of this test.
+
+        The location model of the OLS model is initialized with its closed form solution.
+        The initialized estimator is cached so that it is only built once and can be shared
+        between reading out the OLS coefficients and finalizing the OLS fit.
+
+        :return: Initialized OLS estimator.
+        """
+        if "estim_ols" not in self._cache:
+            from batchglm.api.models.tf1.glm_norm import Estimator, InputDataGLM
+
+            input_data_ols = InputDataGLM(
+                data=self.model_estim.input_data.data,
+                design_loc=self.model_estim.input_data.design_loc,
+                design_scale=self.model_estim.input_data.design_scale[:, [0]],
+                constraints_loc=self.model_estim.input_data.constraints_loc,
+                constraints_scale=self.model_estim.input_data.constraints_scale[[0], [0]],
+                size_factors=self.model_estim.input_data.size_factors,
+                feature_names=self.model_estim.input_data.features,
+            )
+            estim_ols = Estimator(
+                input_data=input_data_ols,
+                init_model=None,
+                init_a="standard",
+                init_b="standard",
+                dtype=self.model_estim.a_var.dtype
+            )
+            estim_ols.initialize()
+            self._cache["estim_ols"] = estim_ols
+        return self._cache["estim_ols"]
+
+    def _fit_ols(self):
+        """
+        Fit an OLS model to the data of this test as a reference for the user supplied model.
+
+        The fit is only run once and is shared by all OLS comparison plots. An estimator that
+        was already initialized by _fit_ols_a_var() is finalized instead of building a new one.
+
+        :return: Store of the fitted OLS model.
+        """
+        if self._store_ols is None:
+            self._store_ols = self._init_ols().finalize()
+            # finalize() closes the session of the estimator, it cannot be reused.
+            del self._cache["estim_ols"]
+        return self._store_ols
+
+    def _fit_ols_a_var(self) -> np.ndarray:
+        """
+        Location model coefficients of an OLS model fit to the data of this test.
+
+        Only the initialized location model is read out if no full OLS fit is stored yet,
+        this avoids the evaluation of the model diagnostics in finalize().
+        The initialized estimator is kept so that a later call to _fit_ols() can finalize it.
+
+        :return: Location model coefficients of OLS model (coefficients x genes).
+        """
+        if self._store_ols is not None:
+            return self._store_ols.a_var
+        if "a_var_ols_fit" not in self._cache:
+            estim_ols = self._init_ols()
+            self._cache["a_var_ols_fit"] = estim_ols.run(estim_ols.model.a_var)
+        return self._cache["a_var_ols_fit"]
+
     def plot_comparison_ols_coef(
             self,
             size=20,
@@ -951,45 +1170,25 @@ class DifferentialExpressionTestWald(_DifferentialExpressionTestSingle):
         import matplotlib.pyplot as plt
         from matplotlib import gridspec
         from matplotlib import rcParams
-        from batchglm.api.models.tf1.glm_norm import Estimator, InputDataGLM
 
         plt.ioff()
 
-        # Run OLS model fit to have comparison coefficients.
-        if self._store_ols is None:
-            input_data_ols = InputDataGLM(
-                data=self.model_estim.input_data.data,
-                design_loc=self.model_estim.input_data.design_loc,
-                design_scale=self.model_estim.input_data.design_scale[:, [0]],
-                constraints_loc=self.model_estim.input_data.constraints_loc,
-                constraints_scale=self.model_estim.input_data.constraints_scale[[0], [0]],
-                size_factors=self.model_estim.input_data.size_factors,
-                feature_names=self.model_estim.input_data.features,
-            )
-            estim_ols = Estimator(
-                input_data=input_data_ols,
-                init_model=None,
-                init_a="standard",
-                init_b="standard",
-                dtype=self.model_estim.a_var.dtype
-            )
-            estim_ols.initialize()
-            store_ols = estim_ols.finalize()
-            self._store_ols = store_ols
-        else:
-            store_ols = self._store_ols
-
         # Prepare parameter summary of both model fits.
         par_loc = self.model_estim.input_data.data.coords["design_loc_params"].values
 
-        a_var_ols = store_ols.a_var
-        a_var_ols[1:, :] = (a_var_ols[1:, :] + a_var_ols[[0], :]) / a_var_ols[[0], :]
-
-        a_var_user = self.model_estim.a_var
         # Translate coefficients from both fits to be multiplicative in identity space.
+        # The translated OLS coefficients are stored so that the fitted coefficients are not modified.
+        if "a_var_ols" not in self._cache:
+            # Run OLS model fit to have comparison coefficients.
+            a_var_ols = np.array(self._fit_ols_a_var())
+            a_var_ols[1:, :] = (a_var_ols[1:, :] + a_var_ols[[0], :]) / a_var_ols[[0], :]
+            self._cache["a_var_ols"] = a_var_ols
+        a_var_ols = self._cache["a_var_ols"]
+
         if self.noise_model == "nb":
-            a_var_user = np.exp(a_var_user)  # self.model_estim.inverse_link_loc(a_var_user)
+            a_var_user = np.exp(self.model_estim.a_var)  # self.model_estim.inverse_link_loc(a_var_user)
         elif self.noise_model == "norm":
+            a_var_user = np.array(self.model_estim.a_var)
             a_var_user[1:, :] = (a_var_user[1:, :] + a_var_user[[0], :]) / a_var_user[[0], :]
         else:
             raise ValueError("noise model %s not yet supported for plot_comparison_ols" % self.noise_model)
@@ -1032,15 +1231,16 @@ class DifferentialExpressionTestWald(_DifferentialExpressionTestSingle):
                 ax=ax,
                 s=size
             )
+            line = np.array([min(x.min(), y.min()), max(x.max(), y.max())])
             sns.lineplot(
-                x=np.array([np.min([np.min(x), np.min(y)]), np.max([np.max(x), np.max(y)])]),
-                y=np.array([np.min([np.min(x), np.min(y)]), np.max([np.max(x), np.max(y)])]),
+                x=line,
+                y=line,
                 ax=ax,
                 color="red",
                 legend=False
             )
             ax.set(xlabel="user supplied model", ylabel="OLS model")
-            title_i = par_loc[i] + " (R=" + str(np.round(np.corrcoef(x, y)[0, 1], 3)) + ")"
+            title_i = par_loc[i] + " (R=" + str(np.round(_pearson(x, y), 3)) + ")"
             ax.set_title(title_i)
 
         # Save, show and return figure.
@@ -1090,33 +1290,11 @@ class DifferentialExpressionTestWald(_DifferentialExpressionTestSingle):
         import matplotlib.pyplot as plt
         from matplotlib import gridspec
         from matplotlib import rcParams
-        from batchglm.api.models.tf1.glm_norm import Estimator, InputDataGLM
 
         plt.ioff()
 
         # Run OLS model fit to have comparison coefficients.
-        if self._store_ols is None:
-            input_data_ols = InputDataGLM(
-                data=self.model_estim.input_data.data,
-                design_loc=self.model_estim.input_data.design_loc,
-                design_scale=self.model_estim.input_data.design_scale[:, [0]],
-                constraints_loc=self.model_estim.input_data.constraints_loc,
-                constraints_scale=self.model_estim.input_data.constraints_scale[[0], [0]],
-                size_factors=self.model_estim.input_data.size_factors,
-                feature_names=self.model_estim.input_data.features,
-            )
-            estim_ols = Estimator(
-                input_data=input_data_ols,
-                init_model=None,
-                init_a="standard",
-                init_b="standard",
-                dtype=self.model_estim.a_var.dtype
-            )
-            estim_ols.initialize()
-            store_ols = estim_ols.finalize()
-            self._store_ols = store_ols
-        else:
-            store_ols = self._store_ols
+        store_ols = self._fit_ols()
 
         # Prepare parameter summary of both model fits.
         plt.ioff()
@@ -1142,13 +1320,21 @@ class DifferentialExpressionTestWald(_DifferentialExpressionTestSingle):
             k=np.min([20, self.model_estim.input_data.design_loc.shape[0]])
         )
 
-        x = np.asarray(self.model_estim.X[pred_n_cells, :]).flatten()
+        # Slice the sampled rows first so that only these are densified.
+        x = self.model_estim.X[pred_n_cells, :]
+        if isinstance(x, dask.array.core.Array):
+            x = x.compute()
+        if isinstance(x, scipy.sparse.spmatrix) or isinstance(x, sparse.COO):
+            x = x.todense()
+        x = np.asarray(x).ravel()
 
+        # The OLS model was fit on the same location model design, the sampled design rows are shared.
+        design_pred = np.asarray(self.model_estim.input_data.design_loc[pred_n_cells, :])
         y_user = self.model_estim.model.inverse_link_loc(
-            np.matmul(self.model_estim.input_data.design_loc[pred_n_cells, :], self.model_estim.a_var).flatten()
+            (design_pred @ np.asarray(self.model_estim.a_var)).ravel()
         )
         y_ols = store_ols.inverse_link_loc(
-            np.matmul(store_ols.design_loc[pred_n_cells, :], store_ols.a_var).flatten()
+            (design_pred @ np.asarray(store_ols.a_var)).ravel()
         )
         if log1p_transform:
             x = np.log(x+1)
@@ -1180,9 +1366,10 @@ class DifferentialExpressionTestWald(_DifferentialExpressionTestSingle):
             ax=ax0,
             s=size
         )
+        line = np.array([min(x.min(), y.min()), max(x.max(), y.max())])
         sns.lineplot(
-            x=np.array([np.min([np.min(x), np.min(y)]), np.max([np.max(x), np.max(y)])]),
-            y=np.array([np.min([np.min(x), np.min(y)]), np.max([np.max(x), np.max(y)])]),
+            x=line,
+            y=line,
             ax=ax0,
             color="red",
             legend=False
@@ -1245,77 +1432,92 @@ class DifferentialExpressionTestWald(_DifferentialExpressionTestSingle):
         :return summaries_genes: List with data frame for seaborn in it.
         """
 
+        if "feature_index" not in self._cache:
+            self._cache["feature_index"] = {f: i for i, f in enumerate(self.model_estim.input_data.features)}
+        feature_index = self._cache["feature_index"]
+        for g in gene_names:
+            assert g in feature_index, "gene %s not found" % g
+        g_idx = [feature_index[g] for g in gene_names]
+
+        # Raw data for boxplot of all genes:
+        y_block = self.model_estim.x[:, g_idx]
+        if isinstance(y_block, dask.array.core.Array):
+            y_block = y_block.compute()
+        if isinstance(y_block, scipy.sparse.spmatrix) or isinstance(y_block, sparse.COO):
+            y_block = y_block.todense()
+        y_block = np.asarray(y_block)
+        # Model fits of all genes, sampled in a single draw:
+        loc = self.model_estim.location[:, g_idx]
+        scale = self.model_estim.scale[:, g_idx]
+        if isinstance(loc, dask.array.core.Array):
+            loc = loc.compute()
+        if isinstance(scale, dask.array.core.Array):
+            scale = scale.compute()
+        if self.noise_model == "nb":
+            yhat_block = np.random.negative_binomial(
+                n=scale,
+                p=1 - loc / (scale + loc)
+            )
+        elif self.noise_model == "norm":
+            yhat_block = np.random.normal(
+                loc=loc,
+                scale=scale
+            )
+        else:
+            raise ValueError("noise model %s not yet supported for plot_gene_fits" % self.noise_model)
+
+        # Covariate labels are shared by all genes and are converted to strings once.
+        if covariate_x is not None:
+            assert self.sample_description is not None, "sample_description was not provided to test.wald()"
+            if covariate_x in self.sample_description.columns:
+                x_labels = self.sample_description[covariate_x].values.astype(str)
+            else:
+                raise ValueError("covariate_x=%s not found in location model" % covariate_x)
+        else:
+            x_labels = " "
+
+        if covariate_hue is not None:
+            assert self.sample_description is not None, "sample_description was not provided to test.wald()"
+            if covariate_hue in self.sample_description.columns:
+                if incl_fits:
+                    hue_labels = self.sample_description[covariate_hue].values.astype(str)
+                    hue_raw = np.char.add(hue_labels, "_obs")
+                    hue_fit = np.char.add(hue_labels, "_fit")
+                else:
+                    hue_raw = self.sample_description[covariate_hue].values
+            else:
+                raise ValueError("covariate_hue=%s not found in location model" % covariate_hue)
+        else:
+            hue_raw = "obs"
+            hue_fit = "fit"
+        # Categories are the same for all genes and are inferred only once.
+        x_dtype = pd.Categorical(np.atleast_1d(x_labels), ordered=True).dtype
+        if incl_fits:
+            hue_dtype = pd.Categorical(np.append(hue_raw, hue_fit), ordered=True).dtype
+        else:
+            hue_dtype = pd.Categorical(np.atleast_1d(hue_raw), ordered=True).dtype
+
         summaries_genes = []
         for i, g in enumerate(gene_names):
-            assert g in self.model_estim.input_data.features, "gene %g not found" % g
-            g_idx = self.model_estim.input_data.features.index(g)
-            # Raw data for boxplot:
-            y = self.model_estim.x[:, g_idx]
-            if isinstance(y, dask.array.core.Array):
-                y = y.compute()
-            if isinstance(y, scipy.sparse.spmatrix) or isinstance(y, sparse.COO):
-                y = np.asarray(y.todense()).flatten()
-            # Model fits:
-            loc = self.model_estim.location[:, g_idx]
-            scale = self.model_estim.scale[:, g_idx]
-            if self.noise_model == "nb":
-                yhat = np.random.negative_binomial(
-                        n=scale,
-                        p=1 - loc / (scale + loc)
-                    )
-            elif self.noise_model == "norm":
-                yhat = np.random.normal(
-                    loc=loc,
-                    scale=scale
-                )
-            else:
-                raise ValueError("noise model %s not yet supported for plot_gene_fits" % self.noise_model)
+            y = y_block[:, i]
+            yhat = yhat_block[:, i]
 
             # Transform observed data:
             if log1p_transform:
-                y = np.log(y + 1)
-                yhat = np.log(yhat + 1)
-            if isinstance(yhat, dask.array.core.Array):
-                yhat = yhat.compute()
+                y = np.log1p(y)
+                yhat = np.log1p(yhat)
 
             # Build DataFrame which contains all information for raw data:
-            summary_raw = pd.DataFrame({"y": y, "data": "obs"})
+            summary_raw = pd.DataFrame({"y": y, "data": "obs", "x": x_labels, "hue": hue_raw})
             if incl_fits:
-                summary_fit = pd.DataFrame({"y": yhat, "data": "fit"})
-            if covariate_x is not None:
-                assert self.sample_description is not None, "sample_description was not provided to test.wald()"
-                if covariate_x in self.sample_description.columns:
-                    summary_raw["x"] = self.sample_description[covariate_x].values.astype(str)
-                    if incl_fits:
-                        summary_fit["x"] = self.sample_description[covariate_x].values.astype(str)
-                else:
-                    raise ValueError("covariate_x=%s not found in location model" % covariate_x)
-            else:
-                summary_raw["x"] = " "
-                if incl_fits:
-                    summary_fit["x"] = " "
-
-            if covariate_hue is not None:
-                assert self.sample_description is not None, "sample_description was not provided to test.wald()"
-                if covariate_hue in self.sample_description.columns:
-                    if incl_fits:
-                        summary_raw["hue"] = [str(x)+"_obs" for x in self.sample_description[covariate_hue].values]
-                        summary_fit["hue"] = [str(x)+"_fit" for x in self.sample_description[covariate_hue].values]
-                    else:
-                        summary_raw["hue"] = self.sample_description[covariate_hue].values
-                else:
-                    raise ValueError("covariate_x=%s not found in location model" % covariate_x)
-            else:
-                summary_raw["hue"] = "obs"
-                if incl_fits:
-                    summary_fit["hue"] = "fit"
+                summary_fit = pd.DataFrame({"y": yhat, "data": "fit", "x": x_labels, "hue": hue_fit})
 
             if incl_fits:
                 summaries = pd.concat([summary_raw, summary_fit])
             else:
                 summaries = summary_raw
-            summaries.x = pd.Categorical(summaries.x, ordered=True)
-            summaries.hue = pd.Categorical(summaries.hue, ordered=True)
+            summaries.x = summaries.x.astype(x_dtype)
+            summaries.hue = summaries.hue.astype(hue_dtype)
 
             summaries_genes.append(summaries)
 
@@ -1564,60 +1766,50 @@ class DifferentialExpressionTestTT(_DifferentialExpressionTestSingle):
         x0, x1 = split_x(data, grouping)
 
         # Only compute p-values for genes with non-zero observations and non-zero group-wise variance.
-        mean_x0 = np.asarray(np.mean(x0, axis=0)).flatten().astype(dtype=np.float)
-        mean_x1 = np.asarray(np.mean(x1, axis=0)).flatten().astype(dtype=np.float)
-        # Avoid unnecessary mean computation:
-        self._mean = np.asarray(np.average(
-            a=np.vstack([mean_x0, mean_x1]),
-            weights=np.array([x0.shape[0] / (x0.shape[0] + x1.shape[0]),
-                              x1.shape[0] / (x0.shape[0] + x1.shape[0])]),
-            axis=0,
-            returned=False
-        )).flatten()
+        mean_x0, var_x0 = mean_var(x0)
+        mean_x1, var_x1 = mean_var(x1)
+        # Avoid unnecessary mean computation, the overall mean is the group size weighted mean of group means:
+        self._mean = (x0.shape[0] * mean_x0 + x1.shape[0] * mean_x1) / (x0.shape[0] + x1.shape[0])
         self._ave_nonzero = self._mean != 0  # omit all-zero features
-        if isinstance(x0, scipy.sparse.csr_matrix):
-            # Efficient analytic expression of variance without densification.
-            var_x0 = np.asarray(np.mean(x0.power(2), axis=0)).flatten().astype(dtype=np.float) - np.square(mean_x0)
-            var_x1 = np.asarray(np.mean(x1.power(2), axis=0)).flatten().astype(dtype=np.float) - np.square(mean_x1)
-        else:
-            var_x0 = np.asarray(np.var(x0, axis=0)).flatten().astype(dtype=np.float)
-            var_x1 = np.asarray(np.var(x1, axis=0)).flatten().astype(dtype=np.float)
-        self._var_geq_zero = np.logical_or(
-            var_x0 > 0,
-            var_x1 > 0
-        )
-        idx_run = np.where(np.logical_and(self._ave_nonzero, self._var_geq_zero))[0]
-        pval = np.zeros([data.shape[1]]) + np.nan
-        pval[idx_run] = stats.t_test_moments(
-            mu0=mean_x0[idx_run],
-            mu1=mean_x1[idx_run],
-            var0=var_x0[idx_run],
-            var1=var_x1[idx_run],
+        # Group moments are already 1D float64 arrays, no reshaping or casting is necessary.
+        self._var_geq_zero = var_x0 > 0
+        self._var_geq_zero |= var_x1 > 0
+        # Masks are computed once and combined in place below.
+        is_zerovar = np.logical_not(self._var_geq_zero)
+        is_samemean = mean_x0 == mean_x1
+        is_run = np.logical_and(self._ave_nonzero, self._var_geq_zero)
+        pval = np.full([data.shape[1]], np.nan)
+        pval[is_run] = stats.t_test_moments(
+            mu0=mean_x0[is_run],
+            mu1=mean_x1[is_run],
+            var0=var_x0[is_run],
+            var1=var_x1[is_run],
             n0=x0.shape[0],
             n1=x1.shape[0]
         )
-        pval[np.where(np.logical_and(
-            np.logical_and(mean_x0 == mean_x1, self._mean > 0),
-            np.logical_not(self._var_geq_zero)
-        ))[0]] = 1.0
+        is_zerovar_samemean = np.logical_and(is_zerovar, is_samemean)
+        pval[np.logical_and(is_zerovar_samemean, self._mean > 0, out=is_zerovar_samemean)] = 1.0
         # Depening on user choice via is_sig_zerovar:
         # Set p-value to 0 if LFC was non-zero and variances are zero,
         # this causes division by zero in the test statistic. This
         # is a highly significant result if one believes the variance estimate.
         if is_sig_zerovar:
-            pval[np.where(np.logical_and(
-                mean_x0 != mean_x1,
-                np.logical_not(self._var_geq_zero)
-            ))[0]] = 0.0
+            is_zerovar &= np.logical_not(is_samemean, out=is_samemean)
+            pval[is_zerovar] = 0.0
 
         self._pval = pval
 
         if is_logged:
             self._logfc = mean_x1 - mean_x0
         else:
-            mean_x0 = np.nextafter(0, np.inf, out=mean_x0, where=mean_x0 < np.nextafter(0, np.inf))
-            mean_x1 = np.nextafter(0, np.inf, out=mean_x1, where=mean_x1 < np.nextafter(0, np.inf))
-            self._logfc = np.log(mean_x1) - np.log(mean_x0)
+            # The group means are not used anymore and are floored and logged in place.
+            # The difference of logs is used instead of the log of the ratio, which overflows for floored zero means.
+            tiny = np.nextafter(0, np.inf)
+            np.maximum(mean_x0, tiny, out=mean_x0)
+            np.maximum(mean_x1, tiny, out=mean_x1)
+            np.log(mean_x0, out=mean_x0)
+            np.log(mean_x1, out=mean_x1)
+            self._logfc = np.subtract(mean_x1, mean_x0, out=mean_x1)
 
     @property
     def gene_ids(self) -> np.ndarray:
@@ -1631,7 +1823,7 @@ class DifferentialExpressionTestTT(_DifferentialExpressionTestSingle):
         """
         Returns one fold change per gene
         """
-        return self._logfc / np.log(base)
+        return self._logfc * _inv_log(base)
 
     def summary(
             self,
@@ -1650,16 +1842,14 @@ class DifferentialExpressionTestTT(_DifferentialExpressionTestSingle):
         :param mean_thres: Lower bound of average expression for gene to be included.
         :return: Summary table of differential expression test.
         """
-        res = super().summary(**kwargs)
-        res["zero_variance"] = np.logical_not(self._var_geq_zero)
-
-        res = self._threshold_summary(
-            res=res,
+        keep = self._summary_keep(
             qval_thres=qval_thres,
             fc_upper_thres=fc_upper_thres,
             fc_lower_thres=fc_lower_thres,
             mean_thres=mean_thres
         )
+        res = self._summary_table(keep=keep)
+        res["zero_variance"] = np.logical_not(self._subset_genes(self._var_geq_zero, keep))
 
         return res
 
@@ -1689,58 +1879,52 @@ class DifferentialExpressionTestRank(_DifferentialExpressionTestSingle):
         self._gene_names = np.asarray(gene_names)
 
         x0, x1 = split_x(data, grouping)
-
-        mean_x0 = np.asarray(np.mean(x0, axis=0)).flatten().astype(dtype=np.float)
-        mean_x1 = np.asarray(np.mean(x1, axis=0)).flatten().astype(dtype=np.float)
+        if scipy.sparse.issparse(data):
+            # Column slicing of the genes to test is cheap in CSC format.
+            x0 = x0.tocsc()
+            x1 = x1.tocsc()
+
+        # Group moments are computed without densification of sparse data.
+        mean_x0, var_x0 = mean_var(x0)
+        mean_x1, var_x1 = mean_var(x1)
         # Avoid unnecessary mean computation:
-        self._mean = np.asarray(np.average(
-            a=np.vstack([mean_x0, mean_x1]),
-            weights=np.array([x0.shape[0] / (x0.shape[0] + x1.shape[0]),
-                              x1.shape[0] / (x0.shape[0] + x1.shape[0])]),
-            axis=0,
-            returned=False
-        )).flatten()
-        if isinstance(x0, scipy.sparse.csr_matrix):
-            # Efficient analytic expression of variance without densification.
-            var_x0 = np.asarray(np.mean(x0.power(2), axis=0)).flatten().astype(dtype=np.float) - np.square(mean_x0)
-            var_x1 = np.asarray(np.mean(x1.power(2), axis=0)).flatten().astype(dtype=np.float) - np.square(mean_x1)
-        else:
-            var_x0 = np.asarray(np.var(x0, axis=0)).flatten().astype(dtype=np.float)
-            var_x1 = np.asarray(np.var(x1, axis=0)).flatten().astype(dtype=np.float)
-        self._var_geq_zero = np.logical_or(
-            var_x0 > 0,
-            var_x1 > 0
-        )
-        idx_run = np.where(np.logical_and(self._mean != 0, self._var_geq_zero))[0]
-
-        # TODO: can this be done directly on sparse?
-        pval = np.zeros([data.shape[1]]) + np.nan
-        pval[idx_run] = stats.mann_whitney_u_test(
+        self._mean = (x0.shape[0] * mean_x0 + x1.shape[0] * mean_x1) / (x0.shape[0] + x1.shape[0])
+        self._var_geq_zero = var_x0 > 0
+        self._var_geq_zero |= var_x1 > 0
+        is_run = np.logical_and(self._mean != 0, self._var_geq_zero)
+        idx_run = np.flatnonzero(is_run)
+        is_zerovar = np.logical_not(self._var_geq_zero)
+        is_samemean = mean_x0 == mean_x1
+
+        # Sparse group slices are passed on as such and are only densified block-wise in the rank test.
+        pval_run = np.full([data.shape[1]], np.nan)
+        pval_run[idx_run] = stats.mann_whitney_u_test(
             x0=x0[:, idx_run],
             x1=x1[:, idx_run]
         )
-        pval[np.where(np.logical_and(
-            np.logical_and(mean_x0 == mean_x1, self._mean > 0),
-            np.logical_not(self._var_geq_zero)
-        ))[0]] = 1.0
         # Depening on user choice via is_sig_zerovar:
         # Set p-value to 0 if LFC was non-zero and variances are zero,
         # this causes division by zero in the test statistic. This
         # is a highly significant result if one believes the variance estimate.
-        if is_sig_zerovar:
-            pval[np.where(np.logical_and(
-                mean_x0 != mean_x1,
-                np.logical_not(self._var_geq_zero)
-            ))[0]] = 0.0
-
-        self._pval = pval
+        # The three cases are disjoint, all other genes are not tested.
+        self._pval = np.select(
+            condlist=[
+                is_run,
+                is_zerovar & is_samemean & (self._mean > 0),
+                is_zerovar & ~is_samemean & is_sig_zerovar
+            ],
+            choicelist=[pval_run, 1.0, 0.0],
+            default=np.nan
+        )
 
         if is_logged:
             self._logfc = mean_x1 - mean_x0
         else:
-            mean_x0 = np.nextafter(0, np.inf, out=mean_x0, where=mean_x0 < np.nextafter(0, np.inf))
-            mean_x1 = np.nextafter(0, np.inf, out=mean_x1, where=mean_x1 < np.nextafter(0, np.inf))
-            self._logfc = np.log(mean_x1) - np.log(mean_x0)
+            # Both group means are floored and logged in one pass over a stacked array.
+            log_means = np.vstack([mean_x0, mean_x1])
+            np.maximum(log_means, np.nextafter(0, np.inf), out=log_means)
+            np.log(log_means, out=log_means)
+            self._logfc = log_means[1] - log_means[0]
 
     @property
     def gene_ids(self) -> np.ndarray:
@@ -1757,7 +1941,7 @@ class DifferentialExpressionTestRank(_DifferentialExpressionTestSingle):
         if base == np.e:
             return self._logfc
         else:
-            return self._logfc / np.log(base)
+            return self._logfc * _inv_log(base)
 
     def summary(
             self,
@@ -1776,16 +1960,14 @@ class DifferentialExpressionTestRank(_DifferentialExpressionTestSingle):
         :param mean_thres: Lower bound of average expression for gene to be included.
         :return: Summary table of differential expression test.
         """
-        res = super().summary(**kwargs)
-        res["zero_variance"] = np.logical_not(self._var_geq_zero)
-
-        res = self._threshold_summary(
-            res=res,
+        keep = self._summary_keep(
             qval_thres=qval_thres,
             fc_upper_thres=fc_upper_thres,
             fc_lower_thres=fc_lower_thres,
             mean_thres=mean_thres
         )
+        res = self._summary_table(keep=keep)
+        res["zero_variance"] = np.logical_not(self._subset_genes(self._var_geq_zero, keep))
 
         return res
 
@@ -1836,18 +2018,32 @@ class _DifferentialExpressionTestMulti(_DifferentialExpressionTest, metaclass=ab
 
     def _correction(self, method):
         if self._correction_type.lower() == "global":
-            pvals = np.reshape(self.pval, -1)
+            # ravel() and reshape() are views of the contiguous p-value and q-value arrays, not copies.
+            pvals = self.pval.ravel()
             qvals = correction.correct(pvals=pvals, method=method)
-            qvals = np.reshape(qvals, self.pval.shape)
-            return qvals
+            return qvals.reshape(self.pval.shape)
         elif self._correction_type.lower() == "by_test":
-            qvals = np.apply_along_axis(
-                func1d=lambda pv: correction.correct(pvals=pv, method=method),
-                axis=-1,
-                arr=self.pval,
-            )
+            qvals = correction.correct_by_test(pvals=self.pval, method=method)
             return qvals
 
+    @staticmethod
+    def _max_log_fold_change(raw_logfc: np.ndarray) -> np.ndarray:
+        """
+        Maximal log fold change by gene over all pairs of groups.
+
+        :param raw_logfc: (groups x groups x genes) log fold changes.
+        :return: Maximal log fold change by gene, with the sign flipped if it lies in the lower triangle.
+        """
+        # first flatten all dimensions up to the last 'gene' dimension
+        flat_logfc = raw_logfc.reshape(-1, raw_logfc.shape[-1])
+        # next, get argmax of flattened logfc and gather the maxima along the same flat index
+        idx_max = flat_logfc.argmax(0)
+        logfc = np.take_along_axis(flat_logfc, idx_max[np.newaxis, :], axis=0)[0]
+        # if logfc is maximal in the lower triangular matrix, multiply it with -1
+        r, c = np.divmod(idx_max, raw_logfc.shape[1])
+        np.negative(logfc, out=logfc, where=r > c)
+        return logfc
+
     def summary(self, **kwargs) -> pd.DataFrame:
         """
         Summarize differential expression results into an output table.
@@ -1862,15 +2058,10 @@ class _DifferentialExpressionTestMulti(_DifferentialExpressionTest, metaclass=ab
         """
         assert self.gene_ids is not None
 
-        # calculate maximum logFC of lower triangular fold change matrix
-        raw_logfc = self.log_fold_change(base=2.)
-
-        # first flatten all dimensions up to the last 'gene' dimension
-        flat_logfc = raw_logfc.reshape(-1, raw_logfc.shape[-1])
-        # next, get argmax of flattened logfc and unravel the true indices from it
-        r, c = np.unravel_index(flat_logfc.argmax(0), raw_logfc.shape[:2])
-        # if logfc is maximal in the lower triangular matrix, multiply it with -1
-        logfc = raw_logfc[r, c, np.arange(raw_logfc.shape[-1])] * np.where(r <= c, 1, -1)
+        # The aggregation over all tests only depends on the test results and is computed once,
+        # a copy is returned so that callers can modify their table.
+        if "summary" in self._cache:
+            return self._cache["summary"].copy()
 
         res = pd.DataFrame({
             "gene": self.gene_ids,
@@ -1879,12 +2070,13 @@ class _DifferentialExpressionTestMulti(_DifferentialExpressionTest, metaclass=ab
             # return minimal qval by gene:
             "qval": np.min(self.qval.reshape(-1, self.qval.shape[-1]), axis=0),
             # return maximal logFC by gene:
-            "log2fc": np.asarray(logfc),
+            "log2fc": self._max_log_fold_change(raw_logfc=self.log_fold_change(base=2.)),
             # return mean expression across all groups by gene:
-            "mean": np.asarray(self.mean)
-        })
+            "mean": self.mean
+        }, copy=False)  # only copies of the cached table are handed out
+        self._cache["summary"] = res
 
-        return res
+        return res.copy()
 
 
 class DifferentialExpressionTestVsRest(_DifferentialExpressionTestMulti):
@@ -1908,6 +2100,7 @@ class DifferentialExpressionTestVsRest(_DifferentialExpressionTestMulti):
         self._logfc = logfc
         self._mean = np.asarray(ave).flatten()
         self.groups = list(np.asarray(groups))
+        self._group_index = {x: i for i, x in enumerate(self.groups)}
         self._tests = tests
 
         _ = self.qval
@@ -1934,23 +2127,28 @@ class DifferentialExpressionTestVsRest(_DifferentialExpressionTestMulti):
         if base == np.e:
             return self._logfc
         else:
-            return self._logfc / np.log(base)
+            return self._logfc * _inv_log(base)
 
     def _check_group(self, group):
-        if group not in self.groups:
+        if group not in self._group_index:
             raise ValueError('group "%s" not recognized' % group)
 
     def pval_group(self, group):
         self._check_group(group)
-        return self.pval[0, self.groups.index(group), :]
+        return self.pval[0, self._group_index[group], :]
 
     def qval_group(self, group):
         self._check_group(group)
-        return self.qval[0, self.groups.index(group), :]
+        return self.qval[0, self._group_index[group], :]
 
     def log_fold_change_group(self, group, base=np.e):
         self._check_group(group)
-        return self.log_fold_change(base=base)[0, self.groups.index(group), :]
+        # Select the group before converting the base so that only its fold changes are scaled.
+        logfc = self.log_fold_change()[0, self._group_index[group], :]
+        if base == np.e:
+            return logfc
+        else:
+            return logfc * _inv_log(base)
 
     def summary(self, qval_thres=None, fc_upper_thres=None,
                 fc_lower_thres=None, mean_thres=None,
@@ -2001,7 +2199,7 @@ class DifferentialExpressionTestVsRest(_DifferentialExpressionTestMulti):
             "pval": self.pval_group(group=group),
             "qval": self.qval_group(group=group),
             "log2fc": self.log_fold_change_group(group=group, base=2),
-            "mean": np.asarray(self.mean)
+            "mean": self.mean
         })
 
         res = self._threshold_summary(
@@ -2025,8 +2223,10 @@ class DifferentialExpressionTestByPartition(_DifferentialExpressionTestMulti):
         self.partitions = list(np.asarray(partitions))
         self._tests = tests
         self._gene_ids = tests[0].gene_ids
-        self._pval = np.expand_dims(np.vstack([x.pval for x in tests]), axis=0)
-        self._logfc = np.expand_dims(np.vstack([x.log_fold_change() for x in tests]), axis=0)
+        # Results of all partitions are stacked once into (1 x partitions x genes) arrays,
+        # in the promoted precision of all partitions' results.
+        self._pval = np.stack([x.pval for x in tests], axis=0)[np.newaxis, :, :]
+        self._logfc = np.stack([x.log_fold_change() for x in tests], axis=0)[np.newaxis, :, :]
         self._mean = np.asarray(ave).flatten()
 
         _ = self.qval
@@ -2043,7 +2243,7 @@ class DifferentialExpressionTestByPartition(_DifferentialExpressionTestMulti):
         if base == np.e:
             return self._logfc
         else:
-            return self._logfc / np.log(base)
+            return self._logfc * _inv_log(base)
 
     def _check_partition(self, partition):
         if partition not in self.partitions:
@@ -13,7 +13,8 @@ import scipy.sparse
 import sparse
 from typing import Union
 
-from .det import _DifferentialExpressionTestSingle, DifferentialExpressionTestWald, DifferentialExpressionTestLRT
+from .det import _DifferentialExpressionTestSingle, DifferentialExpressionTestWald, DifferentialExpressionTestLRT, \
+    _inv_log
 
 logger = logging.getLogger("diffxpy")
 
@@ -35,12 +36,17 @@ class _DifferentialExpressionTestCont(_DifferentialExpressionTestSingle):
             interpolated_spline_basis: np.ndarray,
             noise_model: str
     ):
+        super().__init__()
         self._de_test = de_test
         self._model_estim = model_estim
         self._size_factors = size_factors
         self._continuous_coords = continuous_coords
         self._spline_coefs = spline_coefs
         self._interpolated_spline_basis = interpolated_spline_basis
+        # The interpolation grid is fixed: keep a contiguous spline basis and the grid coordinates
+        # so that repeated plots do not slice the stacked array.
+        self._interpolated_basis = np.ascontiguousarray(interpolated_spline_basis[:, :-1])
+        self._interpolated_coords = np.array(interpolated_spline_basis[:, -1])
         self.noise_model = noise_model
 
     @property
@@ -117,9 +123,13 @@ class _DifferentialExpressionTestCont(_DifferentialExpressionTestSingle):
             idx, genes = self._idx_genes(genes)
 
         min_val, max_val = self.min_max(genes=idx, non_numeric=non_numeric)
-        max_val = np.nextafter(0, 1, out=max_val, where=max_val == 0)
-        min_val = np.nextafter(0, 1, out=min_val, where=min_val == 0)
-        return (np.log(max_val) - np.log(min_val)) / np.log(base)
+        np.maximum(max_val, np.nextafter(0, 1), out=max_val)
+        np.maximum(min_val, np.nextafter(0, 1), out=min_val)
+        np.log(max_val, out=max_val)
+        max_val -= np.log(min_val, out=min_val)
+        if base != np.e:
+            max_val *= _inv_log(base)
+        return max_val
 
     def log2_fold_change(self, genes=None, non_numeric=False):
         """
@@ -150,10 +160,10 @@ class _DifferentialExpressionTestCont(_DifferentialExpressionTestSingle):
         :param genes: List of genes to filter.
         :return: Filtered list of genes
         """
-        genes_found = np.array([x in self.gene_ids for x in genes])
-        if any(np.logical_not(genes_found)):
+        genes_found = np.isin(genes, self.gene_ids)
+        if not genes_found.all():
             logger.info("did not find some genes, omitting")
-            genes = genes[genes_found]
+            genes = np.asarray(genes)[genes_found].tolist()
         return genes
 
     def _filter_genes_int(self, genes: list):
@@ -163,10 +173,10 @@ class _DifferentialExpressionTestCont(_DifferentialExpressionTestSingle):
         :param genes: List of genes to filter.
         :return: Filtered list of genes
         """
-        genes_found = np.array([x < self.x.shape[1] for x in genes])
-        if any(np.logical_not(genes_found)):
+        genes_found = np.asarray(genes) < self.x.shape[1]
+        if not genes_found.all():
             logger.info("did not find some genes, omitting")
-            genes = genes[genes_found]
+            genes = np.asarray(genes)[genes_found].tolist()
         return genes
 
     def _idx_genes(self, genes):
@@ -180,11 +190,14 @@ class _DifferentialExpressionTestCont(_DifferentialExpressionTestSingle):
 
         if isinstance(genes[0], str):
             genes = self._filter_genes_str(genes)
-            idx = np.array([self.gene_ids.tolist().index(x) for x in genes])
+            if "gene_index" not in self._cache:
+                self._cache["gene_index"] = {g: i for i, g in enumerate(self.gene_ids.tolist())}
+            gene_index = self._cache["gene_index"]
+            idx = np.fromiter((gene_index[x] for x in genes), dtype=int, count=len(genes))
         elif isinstance(genes[0], int) or isinstance(genes[0], np.number):
             genes = self._filter_genes_int(genes)
             idx = genes
-            genes = [self.gene_ids.tolist()[x] for x in idx]
+            genes = np.asarray(self.gene_ids)[idx].tolist()
         else:
             raise ValueError("only string and integer elements allowed in genes")
         return idx, genes
@@ -197,13 +210,30 @@ class _DifferentialExpressionTestCont(_DifferentialExpressionTestSingle):
         :param intercept: Whether to include intercept.
         :return: Indices of spline basis parameters of location model.
         """
-        par_loc_names = self._model_estim.input_data.loc_names
-        idx = [par_loc_names.index(x) for x in self._spline_coefs]
-        if 'Intercept' in par_loc_names and intercept:
-            idx = np.concatenate([np.where([[x == 'Intercept' for x in par_loc_names]])[0], idx])
-        return idx
+        # The parameter names do not change after fitting, the lookup is done once per setting of intercept.
+        key = "spline_par_loc_idx_intercept" if intercept else "spline_par_loc_idx"
+        if key not in self._cache:
+            par_loc_names = self._model_estim.input_data.loc_names
+            idx = [par_loc_names.index(x) for x in self._spline_coefs]
+            if 'Intercept' in par_loc_names and intercept:
+                idx = [par_loc_names.index('Intercept')] + idx
+            self._cache[key] = np.asarray(idx)
+        return self._cache[key]
 
-    def _continuous_model(self, idx, non_numeric=False):
+    def _design_basis(self):
+        """
+        Columns of the location model design matrix of the spline basis including the intercept.
+
+        :return: Contiguous (observations x spline basis parameters) array.
+        """
+        if "design_basis" not in self._cache:
+            design_basis = self._model_estim.input_data.design_loc[:, self._spline_par_loc_idx(intercept=True)]
+            if isinstance(design_basis, dask.array.core.Array):
+                design_basis = design_basis.compute()
+            self._cache["design_basis"] = np.ascontiguousarray(design_basis)
+        return self._cache["design_basis"]
+
+    def _continuous_model(self, idx, non_numeric=False, log=False):
         """
         Recover continuous fit for a gene in observed time points.
 
@@ -211,6 +241,7 @@ class _DifferentialExpressionTestCont(_DifferentialExpressionTestSingle):
 
         :param idx: Index of genes to recover fit for.
         :param non_numeric: Whether to include non-numeric covariates in fit.
+        :param log: Whether to return the fit on the log scale of the location model.
         :return: Continuuos fit for each cell for given gene.
         """
         idx = np.asarray(idx)
@@ -224,12 +255,13 @@ class _DifferentialExpressionTestCont(_DifferentialExpressionTestSingle):
                 mu = mu + self._model_estim.input_data.size_factors
         else:
             idx_basis = self._spline_par_loc_idx(intercept=True)
-            mu = np.matmul(self._model_estim.input_data.design_loc[:, idx_basis],
+            mu = np.matmul(self._design_basis(),
                            self._model_estim.model.a[idx_basis, :][:, idx])
         if isinstance(mu, dask.array.core.Array):
             mu = mu.compute()
 
-        mu = np.exp(mu)
+        if not log:
+            mu = np.exp(mu)
         return mu
 
     def _continuous_interpolation(self, idx):
@@ -246,15 +278,32 @@ class _DifferentialExpressionTestCont(_DifferentialExpressionTestSingle):
             idx = np.array([idx])
 
         idx_basis = self._spline_par_loc_idx(intercept=True)
-        a = self._model_estim.model.a[idx_basis, :]
+        # Select the requested genes before a dask array is computed.
+        a = self._model_estim.model.a[idx_basis, :][:, idx]
         if isinstance(a, dask.array.core.Array):
-            a = a.compute()[:, idx]
-        else:
-            a = a[:, idx]
-        eta_loc = np.matmul(self._interpolated_spline_basis[:, :-1], a)
-        mu = np.exp(eta_loc)
-        t_eval = self._interpolated_spline_basis[:, -1]
-        return t_eval, mu
+            a = a.compute()
+        mu = np.matmul(self._interpolated_basis, a)
+        np.exp(mu, out=mu)
+        return self._interpolated_coords, mu
+
+    def _continuous_model_batch(self, idx, non_numeric=False):
+        """
+        Recover continuous fits for a set of genes in observed time points on the log scale.
+
+        The fits of a block of genes are recovered in one matrix product, blocks are
+        bounded so that only a block of the fitted values is held in memory at a time.
+        The fits are not exponentiated: exp is monotonic, so extrema and their positions
+        can be found on the log scale and only the extrema need to be exponentiated.
+
+        :param idx: Index of genes to recover fit for.
+        :param non_numeric: Whether to include non-numeric covariates in fit.
+        :return: Generator of position slices into idx and log continuous fits (cells x genes in slice).
+        """
+        idx = np.asarray(idx)
+        block_size = max(1, 10000000 // self.x.shape[0])
+        for start in range(0, idx.shape[0], block_size):
+            block = slice(start, min(start + block_size, idx.shape[0]))
+            yield block, self._continuous_model(idx=idx[block], non_numeric=non_numeric, log=True)
 
     def min_max(self, genes, non_numeric=False):
         """
@@ -265,13 +314,12 @@ class _DifferentialExpressionTestCont(_DifferentialExpressionTestSingle):
         :return: Array of minimum and maximum fitted expression values by gene.
         """
         idx, genes = self._idx_genes(genes)
-        mins = []
-        maxs = []
-        for i in idx:
-            vals = self._continuous_model(idx=i, non_numeric=non_numeric)
-            mins.append(np.min(vals))
-            maxs.append(np.max(vals))
-        return np.array(mins), np.array(maxs)
+        mins = np.zeros([len(idx)])
+        maxs = np.zeros([len(idx)])
+        for block, log_vals in self._continuous_model_batch(idx=idx, non_numeric=non_numeric):
+            mins[block] = np.min(log_vals, axis=0)
+            maxs[block] = np.max(log_vals, axis=0)
+        return np.exp(mins, out=mins), np.exp(maxs, out=maxs)
 
     def max(self, genes, non_numeric=False):
         """
@@ -282,8 +330,10 @@ class _DifferentialExpressionTestCont(_DifferentialExpressionTestSingle):
         :return: Maximum fitted expression value by gene.
         """
         idx, genes = self._idx_genes(genes)
-        return np.array([np.max(self._continuous_model(idx=i, non_numeric=non_numeric))
-                         for i in idx])
+        maxs = np.zeros([len(idx)])
+        for block, log_vals in self._continuous_model_batch(idx=idx, non_numeric=non_numeric):
+            maxs[block] = np.max(log_vals, axis=0)
+        return np.exp(maxs, out=maxs)
 
     def min(self, genes, non_numeric=False):
         """
@@ -294,8 +344,10 @@ class _DifferentialExpressionTestCont(_DifferentialExpressionTestSingle):
         :return: Maximum fitted expression value by gene.
         """
         idx, genes = self._idx_genes(genes)
-        return np.array([np.min(self._continuous_model(idx=i, non_numeric=non_numeric))
-                         for i in idx])
+        mins = np.zeros([len(idx)])
+        for block, log_vals in self._continuous_model_batch(idx=idx, non_numeric=non_numeric):
+            mins[block] = np.min(log_vals, axis=0)
+        return np.exp(mins, out=mins)
 
     def argmax(self, genes, non_numeric=False):
         """
@@ -306,8 +358,9 @@ class _DifferentialExpressionTestCont(_DifferentialExpressionTestSingle):
         :return: Maximum fitted expression value by gene.
         """
         idx, genes = self._idx_genes(genes)
-        idx_cont = np.array([np.argmax(self._continuous_model(idx=i, non_numeric=non_numeric))
-                             for i in idx])
+        idx_cont = np.zeros([len(idx)], dtype=int)
+        for block, log_vals in self._continuous_model_batch(idx=idx, non_numeric=non_numeric):
+            idx_cont[block] = np.argmax(log_vals, axis=0)
         return self._continuous_coords[idx_cont]
 
     def argmin(self, genes, non_numeric=False):
@@ -319,8 +372,9 @@ class _DifferentialExpressionTestCont(_DifferentialExpressionTestSingle):
         :return: Maximum fitted expression value by gene.
         """
         idx, genes = self._idx_genes(genes)
-        idx_cont = np.array([np.argmin(self._continuous_model(idx=i, non_numeric=non_numeric))
-                             for i in idx])
+        idx_cont = np.zeros([len(idx)], dtype=int)
+        for block, log_vals in self._continuous_model_batch(idx=idx, non_numeric=non_numeric):
+            idx_cont[block] = np.argmin(log_vals, axis=0)
         return self._continuous_coords[idx_cont]
 
     def plot_genes(
@@ -382,6 +436,9 @@ class _DifferentialExpressionTestCont(_DifferentialExpressionTestSingle):
             )
         )
 
+        # Spline fits of all genes are interpolated at once.
+        t_continuous, yhat_all = self._continuous_interpolation(idx=gene_idx)
+
         # Build axis objects in loop.
         axs = []
         for i, g in enumerate(gene_idx):
@@ -395,8 +452,7 @@ class _DifferentialExpressionTestCont(_DifferentialExpressionTestSingle):
                 y = np.asarray(y.todense()).flatten()
                 if self._model_estim.input_data.size_factors is not None:
                     y = y / self._model_estim.input_data.size_factors
-            t_continuous, yhat = self._continuous_interpolation(idx=g)
-            yhat = yhat.flatten()
+            yhat = yhat_all[:, i]
             if scalings is not None:
                 yhat = np.vstack([
                     [yhat],
@@ -411,8 +467,8 @@ class _DifferentialExpressionTestCont(_DifferentialExpressionTestSingle):
             else:
                 yhat = np.expand_dims(yhat, axis=0)
             if log:
-                y = np.log(y + 1)
-                yhat = np.log(yhat + 1)
+                y = np.log1p(y)
+                yhat = np.log1p(yhat)
 
             if isinstance(yhat, dask.array.core.Array):
                 yhat = yhat.compute()
@@ -501,13 +557,16 @@ class _DifferentialExpressionTestCont(_DifferentialExpressionTestSingle):
         data = data.T
 
         if transform.lower() == "log10":
-            data = np.nextafter(0, 1, out=data, where=data == 0)
-            data = np.log(data) / np.log(10)
+            np.maximum(data, np.nextafter(0, 1), out=data)
+            np.log10(data, out=data)
         elif transform.lower() == "zscore":
+            # data is a fresh array here and is standardized in place.
+            data = np.asarray(data, dtype=np.float64)
             mu = np.mean(data, axis=0, keepdims=True)
             sd = np.std(data, axis=0, keepdims=True)
-            sd = np.nextafter(0, 1, out=sd, where=sd == 0)
-            data = (data - mu) / sd
+            np.maximum(sd, np.nextafter(0, 1), out=sd)
+            data -= mu
+            data /= sd
         elif transform.lower() == "none":
             pass
         else:
@@ -523,8 +582,7 @@ class _DifferentialExpressionTestCont(_DifferentialExpressionTestSingle):
             num=nticks,
             endpoint=True
         )), dtype=int)
-        xtick_lab = [str(np.round(xcoord[np.argmin(np.abs(xcoord - xcoord[i]))], 2))
-                     for i in xtick_pos]
+        xtick_lab = [str(x) for x in np.round(xcoord[xtick_pos], 2)]
         ax.set_xticks(xtick_pos)
         ax.set_xticklabels(xtick_lab)
         ax.set_xlabel("continuous")
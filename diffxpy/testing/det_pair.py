@@ -12,7 +12,7 @@ from typing import List, Union
 from ..stats import stats
 from . import correction
 
-from .det import _DifferentialExpressionTestMulti
+from .det import _DifferentialExpressionTestMulti, _inv_log
 
 logger = logging.getLogger("diffxpy")
 
@@ -26,38 +26,34 @@ class _DifferentialExpressionTestPairwiseBase(_DifferentialExpressionTestMulti):
     """
 
     groups: List[str]
+    _group_index: dict
     _pval: Union[None, np.ndarray]
     _qval: Union[None, np.ndarray]
     _logfc: Union[None, np.ndarray]
 
     def _get_group_idx(self, groups0, groups1):
-        if np.any([x not in self.groups for x in groups0]):
+        if np.any([x not in self._group_index for x in groups0]):
             raise ValueError('element of groups1 not recognized; not in groups %s' % self.groups)
-        if np.any([x not in self.groups for x in groups1]):
+        if np.any([x not in self._group_index for x in groups1]):
             raise ValueError('element of groups2 not recognized; not in groups %s' % self.groups)
 
-        return np.array([self.groups.index(x) for x in groups0]), \
-               np.array([self.groups.index(x) for x in groups1])
+        return np.fromiter((self._group_index[x] for x in groups0), dtype=np.intp, count=len(groups0)), \
+               np.fromiter((self._group_index[x] for x in groups1), dtype=np.intp, count=len(groups1))
 
     def _correction_pairs(self, idx0, idx1, method):
         if self._correction_type.lower() == "global":
             pval = self._pval_pairs(idx0=idx0, idx1=idx1)
-            pval_reshape = np.reshape(pval, -1)
-            qvals = correction.correct(pvals=pval_reshape, method=method)
-            qvals = np.reshape(qvals, pval.shape)
+            qvals = correction.correct(pvals=pval.ravel(), method=method)
+            qvals = qvals.reshape(pval.shape)
         elif self._correction_type.lower() == "by_test":
-            qvals = np.apply_along_axis(
-                func1d=lambda pv: correction.correct(pvals=pv, method=method),
-                axis=-1,
-                arr=self._pval_pairs(idx0=idx0, idx1=idx1)
-            )
+            qvals = correction.correct_by_test(pvals=self._pval_pairs(idx0=idx0, idx1=idx1), method=method)
         return qvals
 
     def log_fold_change(self, base=np.e, **kwargs):
         if base == np.e:
             return self._logfc
         else:
-            return self._logfc / np.log(base)
+            return self._logfc * _inv_log(base)
 
     @abc.abstractmethod
     def _pval_pairs(self, idx0, idx1):
@@ -78,9 +74,17 @@ class _DifferentialExpressionTestPairwiseBase(_DifferentialExpressionTestMulti):
         :param idx1: List of indices of second set of group of observations in pair-wise comparison.
         :param method: Multiple testing correction method.
             Browse available methods in the annotation of statsmodels.stats.multitest.multipletests().
-        :return: q-values
-        """
-        return self._correction_pairs(idx0=idx0, idx1=idx1, method=method)
+        :return: Read-only q-values, copy before modifying.
+        """
+        # Repeated queries of the same pairs reuse the correction. Only the last selection is kept
+        # per correction method so that iterating over many selections does not accumulate q-values.
+        key = ("qval_pairs", method)
+        selection = (tuple(idx0), tuple(idx1))
+        if key not in self._cache or self._cache[key][0] != selection:
+            qvals = np.asarray(self._correction_pairs(idx0=idx0, idx1=idx1, method=method))
+            qvals.setflags(write=False)
+            self._cache[key] = (selection, qvals)
+        return self._cache[key][1]
 
     @abc.abstractmethod
     def _log_fold_change_pairs(self, idx0, idx1, base):
@@ -130,11 +134,12 @@ class _DifferentialExpressionTestPairwiseBase(_DifferentialExpressionTestMulti):
         :param log10_threshold: minimal log10 p-value to return.
         :return: Cleaned log10 transformed p-values.
         """
-        pvals = np.reshape(self.pval_pairs(groups0=groups0, groups1=groups1), -1)
-        pvals = np.nextafter(0, 1, out=pvals, where=pvals == 0)
-        log10_pval_clean = np.log(pvals) / np.log(10)
-        log10_pval_clean[np.isnan(log10_pval_clean)] = 1
-        log10_pval_clean = np.clip(log10_pval_clean, log10_threshold, 0, log10_pval_clean)
+        pvals = np.asarray(self.pval_pairs(groups0=groups0, groups1=groups1), dtype=np.float64).ravel()
+        log10_pval_clean = np.empty_like(pvals)
+        np.clip(pvals, np.nextafter(0, 1), None, out=log10_pval_clean)
+        np.log10(log10_pval_clean, out=log10_pval_clean)
+        np.nan_to_num(log10_pval_clean, copy=False, nan=1.)
+        np.clip(log10_pval_clean, log10_threshold, 0, out=log10_pval_clean)
         return log10_pval_clean
 
     def log10_qval_pairs_clean(self, groups0, groups1, log10_threshold=-30):
@@ -149,11 +154,12 @@ class _DifferentialExpressionTestPairwiseBase(_DifferentialExpressionTestMulti):
         :param log10_threshold: minimal log10 q-value to return.
         :return: Cleaned log10 transformed q-values.
         """
-        qvals = np.reshape(self.qval_pairs(groups0=groups0, groups1=groups1), -1)
-        qvals = np.nextafter(0, 1, out=qvals, where=qvals == 0)
-        log10_qval_clean = np.log(qvals) / np.log(10)
-        log10_qval_clean[np.isnan(log10_qval_clean)] = 1
-        log10_qval_clean = np.clip(log10_qval_clean, log10_threshold, 0, log10_qval_clean)
+        qvals = np.asarray(self.qval_pairs(groups0=groups0, groups1=groups1), dtype=np.float64).ravel()
+        log10_qval_clean = np.empty_like(qvals)
+        np.clip(qvals, np.nextafter(0, 1), None, out=log10_qval_clean)
+        np.log10(log10_qval_clean, out=log10_qval_clean)
+        np.nan_to_num(log10_qval_clean, copy=False, nan=1.)
+        np.clip(log10_qval_clean, log10_threshold, 0, out=log10_qval_clean)
         return log10_qval_clean
 
     def log_fold_change_pairs(
@@ -188,9 +194,31 @@ class _DifferentialExpressionTestPairwiseBase(_DifferentialExpressionTestMulti):
         :param fc_upper_thres: Upper bound of fold-change for gene to be included.
         :param fc_lower_thres: Lower bound of fold-change p-values for gene to be included.
         :param mean_thres: Lower bound of average expression for gene to be included.
-        :return: Summary table of differential expression test.
+        :return: pandas.DataFrame with the following columns:
+
+            - gene: the gene id's
+            - pval: the minimum per-gene p-value of all pairs of distinct groups
+            - qval: the minimum per-gene q-value of all pairs of distinct groups
+            - log2fc: the maximal/minimal (depending on which one is higher) log2 fold change of the genes
+            - mean: the mean expression of the gene across all groups
         """
-        res = super(_DifferentialExpressionTestMulti, self).summary(**kwargs)
+        assert self.gene_ids is not None
+
+        if "summary" not in self._cache:
+            # Groups are not tested against themselves: the diagonal of the (groups x groups x genes)
+            # results only holds placeholders and is excluded from the gene-wise aggregation.
+            is_diag = np.eye(len(self.groups), dtype=bool)[:, :, np.newaxis]
+            pval = np.where(is_diag, np.nan, self.pval)
+            qval = np.where(is_diag, np.nan, self.qval)
+            raw_logfc = np.where(is_diag, -np.inf, self.log_fold_change(base=2.))
+            self._cache["summary"] = pd.DataFrame({
+                "gene": self.gene_ids,
+                "pval": np.nanmin(pval.reshape(-1, pval.shape[-1]), axis=0),
+                "qval": np.nanmin(qval.reshape(-1, qval.shape[-1]), axis=0),
+                "log2fc": self._max_log_fold_change(raw_logfc=raw_logfc),
+                "mean": self.mean
+            }, copy=False)  # only copies of the cached table are handed out
+        res = self._cache["summary"].copy()
 
         return self._threshold_summary(
             res=res,
@@ -236,19 +264,23 @@ class _DifferentialExpressionTestPairwiseBase(_DifferentialExpressionTestMulti):
         # calculate maximum logFC of lower triangular fold change matrix
         raw_logfc = self.log_fold_change_pairs(groups0=groups0, groups1=groups1, base=2)
 
-        # first flatten all dimensions up to the last 'gene' dimension
-        flat_logfc = raw_logfc.reshape(-1, raw_logfc.shape[-1])
-        # next, get argmax of flattened logfc and unravel the true indices from it
-        r, c = np.unravel_index(flat_logfc.argmax(0), raw_logfc.shape[:2])
-        # if logfc is maximal in the lower triangular matrix, multiply it with -1
-        logfc = raw_logfc[r, c, np.arange(raw_logfc.shape[-1])] * np.where(r <= c, 1, -1)
+        flat_pval = pval.reshape(-1, pval.shape[-1])
+        flat_qval = qval.reshape(-1, qval.shape[-1])
+        idx_min = flat_pval.argmin(axis=0)
+        min_pval = np.take_along_axis(flat_pval, idx_min[np.newaxis, :], axis=0)[0]
+        if self._correction_type.lower() == "global":
+            # Globally corrected q-values are monotonic in the p-values, the minimal q-value of
+            # a gene belongs to its minimal p-value.
+            min_qval = np.take_along_axis(flat_qval, idx_min[np.newaxis, :], axis=0)[0]
+        else:
+            min_qval = np.min(flat_qval, axis=0)
 
         res = pd.DataFrame({
             "gene": self.gene_ids,
-            "pval": np.min(pval, axis=(0, 1)),
-            "qval": np.min(qval, axis=(0, 1)),
-            "log2fc": np.asarray(logfc),
-            "mean": np.asarray(self.mean)
+            "pval": min_pval,
+            "qval": min_qval,
+            "log2fc": self._max_log_fold_change(raw_logfc=raw_logfc),
+            "mean": self.mean
         })
 
         res = self._threshold_summary(
@@ -283,6 +315,7 @@ class DifferentialExpressionTestPairwiseStandard(_DifferentialExpressionTestPair
         self._pval = pval
         self._mean = np.asarray(ave).flatten()
         self.groups = list(np.asarray(groups))
+        self._group_index = {x: i for i, x in enumerate(self.groups)}
         self._tests = tests
 
         _ = self.qval
@@ -331,7 +364,7 @@ class DifferentialExpressionTestPairwiseStandard(_DifferentialExpressionTestPair
         if base == np.e:
             return self._logfc[idx0, :, :][:, idx1, :]
         else:
-            return self._logfc[idx0, :, :][:, idx1, :] / np.log(base)
+            return self._logfc[idx0, :, :][:, idx1, :] * _inv_log(base)
 
 
 class DifferentialExpressionTestZTest(_DifferentialExpressionTestPairwiseBase):
@@ -356,9 +389,10 @@ class DifferentialExpressionTestZTest(_DifferentialExpressionTestPairwiseBase):
         self.model_estim = model_estim
         self.grouping = grouping
         self.groups = list(np.asarray(groups))
+        self._group_index = {x: i for i, x in enumerate(self.groups)}
 
         # Values of parameter estimates: coefficients x genes array with one coefficient per group
-        self._theta_mle = model_estim.a_var
+        self._theta_mle = np.asarray(model_estim.a_var)
         # Standard deviation of estimates: coefficients x genes array with one coefficient per group
         # Need .copy() here as nextafter needs mutabls copy.
         theta_sd = np.diagonal(model_estim.fisher_inv, axis1=-2, axis2=-1).T.copy()
@@ -366,25 +400,33 @@ class DifferentialExpressionTestZTest(_DifferentialExpressionTestPairwiseBase):
         self._theta_sd = np.sqrt(theta_sd)
         self._logfc = None
 
-        # Call tests in constructor.
-        _ = self.pval
-        _ = self.qval
-
     def _test(self, **kwargs):
-        pvals = np.tile(np.NaN, [len(self.groups), len(self.groups), self.model_estim.x.shape[1]])
-        for i, g1 in enumerate(self.groups):
-            for j, g2 in enumerate(self.groups[(i + 1):]):
-                j = j + i + 1
-                pvals[i, j, :] = stats.two_coef_z_test(
-                    theta_mle0=self._theta_mle[i, :],
-                    theta_mle1=self._theta_mle[j, :],
-                    theta_sd0=self._theta_sd[i, :],
-                    theta_sd1=self._theta_sd[j, :]
-                )
-                pvals[j, i, :] = pvals[i, j, :]
+        # The z-test is symmetric in the two groups: test each unordered pair of groups once
+        # and write the p-values to both triangles of the (groups x groups x genes) array.
+        # Groups are not tested against themselves.
+        n_groups = len(self.groups)
+        idx0, idx1 = np.triu_indices(n_groups, k=1)
+        pvals = np.full([n_groups, n_groups, self._theta_mle.shape[1]], np.nan)
+        pvals[idx0, idx1, :] = stats.two_coef_z_test(
+            theta_mle0=self._theta_mle[idx0, :],
+            theta_mle1=self._theta_mle[idx1, :],
+            theta_sd0=self._theta_sd[idx0, :],
+            theta_sd1=self._theta_sd[idx1, :]
+        )
+        pvals[idx1, idx0, :] = pvals[idx0, idx1, :]
 
         return pvals
 
+    def log_fold_change(self, base=np.e, **kwargs):
+        """
+        Log fold changes of all pairs of groups.
+
+        :param base: Base of logarithm.
+        :return: (groups x groups x genes) log fold changes of the second over the first group.
+        """
+        idx = np.arange(len(self.groups))
+        return self._log_fold_change_pairs(idx0=idx, idx1=idx, base=base)
+
     @property
     def gene_ids(self) -> np.ndarray:
         return np.asarray(self.model_estim.input_data.features)
@@ -431,16 +473,12 @@ class DifferentialExpressionTestZTest(_DifferentialExpressionTestPairwiseBase):
         :param base: Base of logarithm.
         :return: log fold change values
         """
-        logfc = np.tile(np.NaN, [len(idx0), len(idx1), self.model_estim.x.shape[1]])
-        for i, xi in enumerate(idx0):
-            for j, xj in enumerate(idx1):
-                logfc[i, j, :] = self._theta_mle[xj, :] - self._theta_mle[xi, :]
-                logfc[j, i, :] = -logfc[i, j, :]
+        logfc = self._theta_mle[idx1, :][np.newaxis, :, :] - self._theta_mle[idx0, :][:, np.newaxis, :]
 
         if base == np.e:
             return logfc
         else:
-            return logfc / np.log(base)
+            return logfc * _inv_log(base)
 
 
 class _DifferentialExpressionTestPairwiseLazyBase(_DifferentialExpressionTestPairwiseBase):
@@ -546,9 +584,10 @@ class DifferentialExpressionTestZTestLazy(_DifferentialExpressionTestPairwiseLaz
             self.groups = groups
         else:
             self.groups = groups.tolist()
+        self._group_index = {x: i for i, x in enumerate(self.groups)}
 
         # Values of parameter estimates: coefficients x genes array with one coefficient per group
-        self._theta_mle = model_estim.a_var
+        self._theta_mle = np.asarray(model_estim.a_var)
         # Standard deviation of estimates: coefficients x genes array with one coefficient per group
         # Need .copy() here as nextafter needs mutabls copy.
         theta_sd = np.diagonal(model_estim.fisher_inv, axis1=-2, axis2=-1).T.copy()
@@ -563,18 +602,25 @@ class DifferentialExpressionTestZTestLazy(_DifferentialExpressionTestPairwiseLaz
         :param idx1: List of indices of second set of group of observations in pair-wise comparison.
         :return: p-values
         """
-        pvals = np.tile(np.NaN, [len(idx0), len(idx1), self.model_estim.x.shape[1]])
-        for i, xi in enumerate(idx0):
-            for j, xj in enumerate(idx1):
-                if i != j:
-                    pvals[i, j, :] = stats.two_coef_z_test(
-                        theta_mle0=self._theta_mle[xi, :],
-                        theta_mle1=self._theta_mle[xj, :],
-                        theta_sd0=self._theta_sd[xi, :],
-                        theta_sd1=self._theta_sd[xj, :]
-                    )
-                else:
-                    pvals[i, j, :] = np.array([1.])
+        idx0 = np.asarray(idx0)
+        idx1 = np.asarray(idx1)
+        # Test all selected pairs (len(idx0) x len(idx1) x genes) at once on broadcasted views of the estimates.
+        theta_mle0, theta_mle1 = np.broadcast_arrays(
+            self._theta_mle[idx0, :][:, np.newaxis, :],
+            self._theta_mle[idx1, :][np.newaxis, :, :]
+        )
+        theta_sd0, theta_sd1 = np.broadcast_arrays(
+            self._theta_sd[idx0, :][:, np.newaxis, :],
+            self._theta_sd[idx1, :][np.newaxis, :, :]
+        )
+        pvals = stats.two_coef_z_test(
+            theta_mle0=theta_mle0,
+            theta_mle1=theta_mle1,
+            theta_sd0=theta_sd0,
+            theta_sd1=theta_sd1
+        )
+        # A group compared to itself is not different.
+        pvals[idx0[:, np.newaxis] == idx1[np.newaxis, :], :] = 1.
 
         return pvals
 
@@ -611,12 +657,10 @@ class DifferentialExpressionTestZTestLazy(_DifferentialExpressionTestPairwiseLaz
         :param base: Base of logarithm.
         :return: log fold change values
         """
-        logfc = np.zeros(shape=(len(idx0), len(idx1), self._theta_mle.shape[1]))
-        for i, xi in enumerate(idx0):
-            for j, xj in enumerate(idx1):
-                logfc[i, j, :] = self._theta_mle[xi, :] - self._theta_mle[xj, :]
+        # All pairs (len(idx0) x len(idx1) x genes) in one broadcasted subtraction of the gathered estimates.
+        logfc = np.take(self._theta_mle, idx0, axis=0)[:, np.newaxis, :] - \
+            np.take(self._theta_mle, idx1, axis=0)[np.newaxis, :, :]
 
-        if base == np.e:
-            return logfc
-        else:
-            return logfc / np.log(base)
+        if base != np.e:
+            logfc *= _inv_log(base)
+        return logfc
@@ -117,6 +117,37 @@ def split_x(data, grouping):
     return x0, x1
 
 
+def mean_var(x) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the feature-wise mean and (biased) variance of a data matrix.
+
+    Sparse matrices are reduced over their non-zero entries only, without densification.
+
+    :param x: Data matrix (observations x features).
+    :return: Tuple of 1D arrays with mean and variance of each feature.
+    """
+    if scipy.sparse.issparse(x):
+        if scipy.sparse.isspmatrix_csc(x):
+            # Column indices of the stored entries follow from the column pointers, no conversion is necessary.
+            col = np.repeat(np.arange(x.shape[1]), np.diff(x.indptr))
+        else:
+            x = x.tocsr()
+            col = x.indices
+        n = x.shape[0]
+        # Sum and sum of squares of all features from one sweep over the stored entries, var = E[x^2] - E[x]^2.
+        mean = np.bincount(col, weights=x.data, minlength=x.shape[1]) / n
+        var = np.bincount(col, weights=np.square(x.data, dtype=np.float64), minlength=x.shape[1]) / n
+        var -= np.square(mean)
+        np.maximum(var, 0., out=var)
+    else:
+        x = np.asarray(x)
+        mean = np.mean(x, axis=0, dtype=np.float64)
+        # The deviations reuse the mean instead of np.var() recomputing it, their squares are summed without a copy.
+        dev = np.subtract(x, mean, dtype=np.float64)
+        var = np.einsum("ij,ij->j", dev, dev) / x.shape[0]
+    return mean, var
+
+
 def dmat_unique(dmat, sample_description):
     dmat, idx = np.unique(dmat, axis=0, return_index=True)
     sample_description = sample_description.iloc[idx].reset_index(drop=True)
@@ -1,8 +1,31 @@
 import unittest
+import numpy as np
+
+from diffxpy.testing import correction
 
 
 class TestCorrection(unittest.TestCase):
-    pass
+
+    def test_correct_by_test(self, n_tests: int = 4, n_genes: int = 100):
+        """
+        Test if correction.correct_by_test() matches correction.correct() applied to each test separately,
+        including tests with untested (nan) p-values.
+
+        :param n_tests: Number of tests to correct separately.
+        :param n_genes: Number of genes per test.
+        """
+        np.random.seed(1)
+        pvals = np.random.uniform(size=(n_tests, n_genes))
+        pvals[0, :10] = np.nan
+        pvals[1, :] = np.nan
+
+        for method in ["fdr_bh", "bonferroni"]:
+            qvals = correction.correct_by_test(pvals=pvals, method=method)
+            qvals_ref = np.stack([correction.correct(pvals=pv, method=method) for pv in pvals], axis=0)
+            assert np.allclose(qvals, qvals_ref, equal_nan=True), \
+                "correct_by_test() deviates from correct() for method %s" % method
+
+        return True
 
 
 if __name__ == '__main__':
@@ -157,5 +157,61 @@ class TestPairwiseNullNb(unittest.TestCase, _TestPairwiseNull):
         self._test_null_distribution_basic(test="lrt", lazy=False, quick_scale=False)
 
 
+
+class TestPairwiseSummary(unittest.TestCase):
+
+    def _check_summary(self, det):
+        """
+        Check that summary() aggregates only over pairs of distinct groups.
+        """
+        res = det.summary()
+        idx0, idx1 = np.where(np.logical_not(np.eye(len(det.groups), dtype=bool)))
+        pval = det.pval[idx0, idx1, :]
+        qval = det.qval[idx0, idx1, :]
+        logfc = det.log_fold_change(base=2.)[idx0, idx1, :]
+        assert np.allclose(res["pval"].values, np.min(pval, axis=0))
+        assert np.allclose(res["qval"].values, np.min(qval, axis=0))
+        assert np.allclose(np.abs(res["log2fc"].values), np.max(logfc, axis=0))
+        assert np.all(res["pval"].values > 0)
+
+    def test_summary_standard(self, n_cells: int = 300, n_genes: int = 20):
+        logging.getLogger("diffxpy").setLevel(logging.WARNING)
+
+        np.random.seed(1)
+        sample_description = pd.DataFrame({
+            "condition": [str(x) for x in np.random.randint(3, size=n_cells)]
+        })
+        det = de.test.pairwise(
+            data=np.random.poisson(5, size=(n_cells, n_genes)).astype(float),
+            sample_description=sample_description,
+            grouping="condition",
+            test="t-test",
+            lazy=False,
+            noise_model=None,
+            gene_names=[str(x) for x in range(n_genes)]
+        )
+        self._check_summary(det=det)
+
+    def test_summary_ztest(self, n_cells: int = 300, n_genes: int = 20, n_groups: int = 3):
+        from types import SimpleNamespace
+        from diffxpy.testing.det_pair import DifferentialExpressionTestZTest
+
+        np.random.seed(1)
+        fisher_inv = np.zeros([n_genes, n_groups, n_groups])
+        fisher_inv[:, np.arange(n_groups), np.arange(n_groups)] = np.random.uniform(0.01, 0.1, (n_genes, n_groups))
+        model_estim = SimpleNamespace(
+            a_var=np.random.uniform(0, 2, (n_groups, n_genes)),
+            fisher_inv=fisher_inv,
+            x=np.random.poisson(5, size=(n_cells, n_genes)).astype(float),
+            input_data=SimpleNamespace(features=np.array([str(x) for x in range(n_genes)]))
+        )
+        det = DifferentialExpressionTestZTest(
+            model_estim=model_estim,
+            grouping=np.random.randint(n_groups, size=n_cells),
+            groups=np.arange(n_groups),
+            correction_type="by_test"
+        )
+        self._check_summary(det=det)
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,7 @@
 import logging
 import unittest
 import numpy as np
+import scipy.sparse
 import scipy.stats as stats
 
 import diffxpy.api as de
@@ -138,6 +139,50 @@ class TestStats(unittest.TestCase):
 
         return True
     
+    def test_wilcoxon_sparse(self, n: int = 100, n_test: int = 100):
+        """
+        Test if de.stats.mann_whitney_u_test() generates the same p-values on sparse
+        and on dense input.
+
+        :param n: Number of tests to run.
+        :param n_test: Sample size of each group in each test.
+        """
+        x0 = np.random.poisson(lam=0.5, size=(n_test, n)).astype(float)
+        x1 = np.random.poisson(lam=0.5, size=(n_test, n)).astype(float)
+
+        pvals_dense = de.stats.mann_whitney_u_test(x0=x0, x1=x1)
+        pvals_sparse = de.stats.mann_whitney_u_test(
+            x0=scipy.sparse.csr_matrix(x0),
+            x1=scipy.sparse.csr_matrix(x1)
+        )
+        assert np.allclose(pvals_dense, pvals_sparse, equal_nan=True), "sparse and dense p-values differ"
+
+        return True
+
+    def test_wilcoxon_small_sample(self, n: int = 100):
+        """
+        Test if de.stats.mann_whitney_u_test() generates the same p-values as
+        scipy.stats.mannwhitneyu() for small groups, for which scipy uses the exact
+        test on genes without ties and the normal approximation on genes with ties.
+
+        :param n: Number of tests to run.
+        """
+        for n_test in [3, 8]:
+            x0 = np.random.normal(loc=0, scale=1, size=(n_test, n))
+            x1 = np.random.normal(loc=0.5, scale=1, size=(n_test, n))
+            # Introduce ties in half of the genes.
+            x0[:, :n // 2] = np.round(x0[:, :n // 2])
+            x1[:, :n // 2] = np.round(x1[:, :n // 2])
+
+            pvals = de.stats.mann_whitney_u_test(x0=x0, x1=x1)
+            pvals_scipy = np.array([
+                stats.mannwhitneyu(x=x0[:, i], y=x1[:, i], use_continuity=True, alternative="two-sided").pvalue
+                for i in range(n)
+            ])
+            assert np.allclose(pvals, pvals_scipy), "p-values differ from scipy for groups of size %i" % n_test
+
+        return True
+
     def test_t_test_raw(self, n: int = 1000, n_test: int = 100):
         """
         Test if de.stats.t_test_raw() generates a uniform p-value distribution